@@ -1,23 +1,210 @@
 import datetime
+import os
+import queue
 import sqlite3
-from flask import Flask, g, render_template, request, redirect, url_for
+import time
+from flask import Blueprint, Flask, current_app, g, jsonify, render_template, request, redirect, url_for
 
-app = Flask(__name__)
-DATABASE = "fleetflow.db"
+from geocode import Gazetteer, bounding_box, haversine_km
+from integrity_scan import CHECK_DESCRIPTIONS
+from route_graph import RouteGraph
 
-def get_db():
-    if "db" not in g:
-        conn = sqlite3.connect(DATABASE)
+# Settings for create_app(). Every key can be overridden from the environment
+# with a FLEETFLOW_ prefix, e.g. FLEETFLOW_DATABASE=/srv/fleetflow/fleetflow.db.
+DEFAULT_CONFIG = {
+    "DATABASE": "fleetflow.db",
+    # Offline gazetteer used to geocode delivery addresses (see geocode.py).
+    "GEOCODE_CACHE": "geocode_cache.csv",
+    # Writers wait this long on a locked database before SQLite reports SQLITE_BUSY.
+    "BUSY_TIMEOUT_SECONDS": 2.0,
+    # Connections kept open per worker process; each keeps its own page cache.
+    "DB_POOL_SIZE": 8,
+    # Per-connection SQLite page cache (PRAGMA cache_size) in KiB.
+    "SQLITE_CACHE_SIZE_KIB": 16384,
+    # Memory-mapped I/O lets worker processes share the OS page cache.
+    "SQLITE_MMAP_SIZE": 256 * 1024 * 1024,
+    # Startup work: precompile Jinja templates and read the database file
+    # (up to WARM_MAX_BYTES) so the first requests do not pay for disk I/O.
+    "PRECOMPILE_TEMPLATES": True,
+    "WARM_DATABASE": True,
+    "WARM_MAX_BYTES": 256 * 1024 * 1024,
+}
+ENV_PREFIX = "FLEETFLOW_"
+
+# A busy write transaction is retried this many times with a short backoff.
+WRITE_RETRIES = 5
+WRITE_RETRY_BACKOFF_SECONDS = 0.05
+
+# Every view lives on this blueprint, registered on each app built by create_app().
+bp = Blueprint("fleetflow", __name__)
+
+def parse_setting(raw, default):
+    if isinstance(default, bool):
+        return raw.strip().lower() in ("1", "true", "yes", "on")
+    return type(default)(raw)
+
+def load_config(overrides=None):
+    """
+    Build the settings dict: defaults, then FLEETFLOW_* environment
+    variables, then explicit overrides passed to create_app().
+    """
+    config = dict(DEFAULT_CONFIG)
+    for key, default in DEFAULT_CONFIG.items():
+        raw = os.environ.get(ENV_PREFIX + key)
+        if raw is not None:
+            config[key] = parse_setting(raw, default)
+    config.update(overrides or {})
+    return config
+
+def register_sql_functions(conn):
+    """
+    Python functions the app's SQL relies on. haversine_km lets
+    nearest-delivery searches rank by distance inside SQLite.
+    """
+    conn.create_function("haversine_km", 4, haversine_km, deterministic=True)
+
+class ConnectionPool:
+    """
+    A small per-process pool of SQLite connections.
+
+    Reusing connections keeps each one's page cache warm across requests.
+    The pool notices when it has been inherited by a forked worker and
+    starts afresh there, since SQLite connections must not cross a fork.
+    """
+
+    def __init__(self, path, size, busy_timeout, cache_size_kib, mmap_size):
+        self.path = path
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path, timeout=self.busy_timeout, check_same_thread=False
+        )
         conn.row_factory = sqlite3.Row
         conn.execute("PRAGMA foreign_keys = ON;")
-        g.db = conn
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kib)};")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)};")
+        register_sql_functions(conn)
+        return conn
+
+    def acquire(self):
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._idle = queue.LifoQueue(maxsize=self.size)
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+def warm_database(path, max_bytes):
+    """
+    Read the database file once so its pages are in the OS page cache.
+    Returns the number of bytes read.
+    """
+    total = 0
+    chunk_size = 1024 * 1024
+    with open(path, "rb") as f:
+        while total < max_bytes:
+            chunk = f.read(min(chunk_size, max_bytes - total))
+            if not chunk:
+                break
+            total += len(chunk)
+    return total
+
+def precompile_templates(app):
+    """
+    Load every template into the Jinja cache so the first request for
+    each page does not have to parse and compile it.
+    """
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+def create_app(config=None):
+    """
+    Build a FleetFlow app.
+
+    config: optional dict of settings that take precedence over the
+    FLEETFLOW_* environment variables and DEFAULT_CONFIG.
+    """
+    started = time.perf_counter()
+    app = Flask(__name__)
+    app.config.update(load_config(config))
+
+    app.extensions["fleetflow_pool"] = ConnectionPool(
+        app.config["DATABASE"],
+        size=app.config["DB_POOL_SIZE"],
+        busy_timeout=app.config["BUSY_TIMEOUT_SECONDS"],
+        cache_size_kib=app.config["SQLITE_CACHE_SIZE_KIB"],
+        mmap_size=app.config["SQLITE_MMAP_SIZE"],
+    )
+    app.extensions["fleetflow_geocoder"] = Gazetteer.load(app.config["GEOCODE_CACHE"])
+    app.extensions["fleetflow_route_graph"] = RouteGraph(app.config["DATABASE"])
+    app.register_blueprint(bp)
+    app.teardown_appcontext(close_db)
+    app.register_error_handler(DatabaseBusy, database_busy)
+
+    if app.config["PRECOMPILE_TEMPLATES"]:
+        precompile_templates(app)
+    if app.config["WARM_DATABASE"] and os.path.exists(app.config["DATABASE"]):
+        warm_database(app.config["DATABASE"], app.config["WARM_MAX_BYTES"])
+    if os.path.exists(app.config["DATABASE"]):
+        # Build the route graph now (before --preload forks the workers) so no
+        # request has to wait for the all-pairs computation.
+        try:
+            app.extensions["fleetflow_route_graph"].load()
+        except sqlite3.OperationalError as e:
+            app.logger.warning("Route graph not built at startup: %s", e)
+
+    app.config["STARTUP_SECONDS"] = time.perf_counter() - started
+    app.logger.info(
+        "FleetFlow app ready in %.1f ms", app.config["STARTUP_SECONDS"] * 1000
+    )
+    return app
+
+def get_db():
+    if "db" not in g:
+        g.db = current_app.extensions["fleetflow_pool"].acquire()
     return g.db
 
-@app.teardown_appcontext
 def close_db(exception):
     db = g.pop("db", None)
     if db is not None:
-        db.close()
+        if db.in_transaction:
+            db.rollback()
+        for schema in g.pop("attached_archives", []):
+            db.execute(f"DETACH DATABASE {schema}")
+        current_app.extensions["fleetflow_pool"].release(db)
+
+def geocode(address):
+    """
+    (latitude, longitude) for an address from the offline gazetteer,
+    or (None, None) if it is not known.
+    """
+    gazetteer = current_app.extensions["fleetflow_geocoder"]
+    gazetteer.refresh()
+    return gazetteer.lookup(address)
 
 def log_audit(db, action, table_name, record_id, user="system", details=""):
     """
@@ -32,12 +219,176 @@ def log_audit(db, action, table_name, record_id, user="system", details=""):
         (timestamp, action, table_name, str(record_id), details, user),
     )
 
-@app.route("/")
+class DatabaseBusy(Exception):
+    """
+    Raised by run_write_transaction() when the write lock could not be taken
+    before its deadline. create_app() turns it into a 503 response.
+    """
+
+def database_busy(error):
+    return "The database is busy right now. Please try again in a moment.", 503
+
+def run_write_transaction(db, work):
+    """
+    Run work(db) inside a short BEGIN IMMEDIATE transaction and commit it.
+
+    The write lock is taken up front so two editors never both read a row and
+    then race to upgrade their locks. If another writer holds the database,
+    the transaction is retried with backoff, but all attempts together wait no
+    longer than BUSY_TIMEOUT_SECONDS; after that DatabaseBusy is raised.
+    """
+    busy_timeout = current_app.config["BUSY_TIMEOUT_SECONDS"]
+    deadline = time.monotonic() + busy_timeout
+    try:
+        for attempt in range(WRITE_RETRIES):
+            # Each attempt may only wait for the lock until the shared deadline.
+            remaining = max(deadline - time.monotonic(), 0.0)
+            db.execute(f"PRAGMA busy_timeout = {int(remaining * 1000)}")
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                result = work(db)
+                db.commit()
+                return result
+            except sqlite3.OperationalError as e:
+                db.rollback()
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+            except Exception:
+                db.rollback()
+                raise
+            backoff = WRITE_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+            if time.monotonic() + backoff >= deadline:
+                break
+            time.sleep(backoff)
+        raise DatabaseBusy()
+    finally:
+        db.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+
+def form_text(value):
+    """
+    A value as an HTML form carries it, so stored values can be compared with
+    the hidden original_* inputs.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+def loaded_values(row, fields):
+    """
+    The form fields of a row, rendered as hidden original_* inputs by
+    form_original.html so a later save can be merged three ways.
+    """
+    return {field: row[field] for field in fields}
+
+def read_original(fields):
+    """
+    The values the submitted form was loaded with, or None if it did not
+    send them (e.g. a form rendered before they were added).
+    """
+    if not all(f"original_{field}" in request.form for field in fields):
+        return None
+    return {field: request.form[f"original_{field}"] for field in fields}
+
+def edited_columns(values, original):
+    """
+    Columns this editor changed from what their form was loaded with. Without
+    the original values every submitted column counts as edited.
+    """
+    if original is None:
+        return list(values)
+    return [
+        col for col, value in values.items()
+        if col not in original or form_text(value) != original[col]
+    ]
+
+def merge_conflicts(current, values, original):
+    """
+    Columns both this editor and whoever saved since changed, to different
+    values. These are the only ones that need a human to decide.
+    """
+    return [
+        col for col in edited_columns(values, original)
+        if current[col] != values[col]
+        and (original is None or col not in original or form_text(current[col]) != original[col])
+    ]
+
+def update_versioned(db, table, key_column, key, expected_version, values, original=None):
+    """
+    Apply an optimistic-concurrency UPDATE to a single row.
+
+    Only columns whose submitted value differs from the stored one are written,
+    and the row's version is bumped. If someone else saved the row after this
+    editor loaded it, the save is merged three ways against `original` (the
+    values the form was loaded with): the other editor's changes are kept and
+    this editor's are applied on top, unless both changed the same column.
+    Must run inside run_write_transaction().
+    Returns (current_row, changed_columns):
+      - current_row is None if the row no longer exists
+      - changed_columns is None if both editors changed the same column
+    """
+    current = db.execute(
+        f"SELECT * FROM {table} WHERE {key_column} = ?",
+        (key,),
+    ).fetchone()
+    if current is None:
+        return None, []
+    if current["version"] == expected_version:
+        changed = [col for col, value in values.items() if current[col] != value]
+    else:
+        if merge_conflicts(current, values, original):
+            return current, None
+        changed = [col for col in edited_columns(values, original) if current[col] != values[col]]
+    if not changed:
+        return current, changed
+
+    assignments = ", ".join(f"{col} = ?" for col in changed)
+    cursor = db.execute(
+        f"""
+        UPDATE {table}
+        SET {assignments}, version = version + 1
+        WHERE {key_column} = ? AND version = ?
+        """,
+        [values[col] for col in changed] + [key, current["version"]],
+    )
+    if cursor.rowcount == 0:
+        return current, None
+    return current, changed
+
+def conflict_fields(current, values, original=None):
+    """
+    List (column, your_value, saved_value) for every field both editors
+    changed to different values.
+    """
+    return [
+        (col, values[col], current[col])
+        for col in merge_conflicts(current, values, original)
+    ]
+
+def merged_form_row(current, values, original=None):
+    """
+    Build the row used to re-render a form after a conflict: the stored row
+    (keeping the other editor's changes) with the fields this editor changed
+    on top, carrying the stored version so that saving again deliberately
+    applies them.
+    """
+    row = dict(current)
+    for col in edited_columns(values, original):
+        row[col] = values[col]
+    return row
+
+def parse_version(raw):
+    return int(raw) if raw else 0
+
+@bp.route("/")
 def index():
     return render_template("index.html")
 
 # ---------- VEHICLES CRUD ----------
-@app.route("/vehicles")
+VEHICLE_FORM_FIELDS = ("type", "capacity", "status", "license_plate", "current_odometer")
+
+@bp.route("/vehicles")
 def list_vehicles():
     """
     List all vehicles in a simple table.
@@ -48,7 +399,7 @@ def list_vehicles():
     ).fetchall()
     return render_template("vehicles.html", vehicles=vehicles)
 
-@app.route("/vehicles/new", methods=["GET", "POST"])
+@bp.route("/vehicles/new", methods=["GET", "POST"])
 def create_vehicle():
     """
     Create a new vehicle.
@@ -67,8 +418,7 @@ def create_vehicle():
         capacity = int(capacity_raw) if capacity_raw else None
         current_odometer = int(odometer_raw) if odometer_raw else None
 
-        db = get_db()
-        try:
+        def apply_insert(db):
             db.execute(
                 """
                 INSERT INTO vehicles (
@@ -85,14 +435,16 @@ def create_vehicle():
                 user="demo_user",
                 details="Created new vehicle",
             )
-            db.commit()
-            return redirect(url_for("list_vehicles"))
+
+        try:
+            run_write_transaction(get_db(), apply_insert)
+            return redirect(url_for(".list_vehicles"))
         except sqlite3.IntegrityError as e:
             error = f"Error creating vehicle: {e}"
             return render_template(
                 "vehicle_form.html",
                 vehicle=None,
-                form_action=url_for("create_vehicle"),
+                form_action=url_for(".create_vehicle"),
                 is_edit=False,
                 error=error,
             )
@@ -100,12 +452,12 @@ def create_vehicle():
     return render_template(
         "vehicle_form.html",
         vehicle=None,
-        form_action=url_for("create_vehicle"),
+        form_action=url_for(".create_vehicle"),
         is_edit=False,
         error=None,
     )
 
-@app.route("/vehicles/<vehicle_id>/edit", methods=["GET", "POST"])
+@bp.route("/vehicles/<vehicle_id>/edit", methods=["GET", "POST"])
 def edit_vehicle(vehicle_id):
     """
     Edit an existing vehicle.
@@ -123,26 +475,34 @@ def edit_vehicle(vehicle_id):
 
         capacity = int(capacity_raw) if capacity_raw else None
         current_odometer = int(odometer_raw) if odometer_raw else None
+        expected_version = parse_version(request.form.get("version"))
+        original = read_original(VEHICLE_FORM_FIELDS)
 
-        try:
-            db.execute(
-                """
-                UPDATE vehicles
-                SET type = ?, capacity = ?, status = ?, license_plate = ?, current_odometer = ?
-                WHERE vehicle_id = ?
-                """,
-                (v_type, capacity, status, license_plate, current_odometer, vehicle_id),
-            )
-            log_audit(
-                db,
-                action="UPDATE",
-                table_name="vehicles",
-                record_id=vehicle_id,
-                user="demo_user",
-                details="Updated vehicle",
+        values = {
+            "type": v_type,
+            "capacity": capacity,
+            "status": status,
+            "license_plate": license_plate,
+            "current_odometer": current_odometer,
+        }
+
+        def apply_edit(db):
+            current, changed = update_versioned(
+                db, "vehicles", "vehicle_id", vehicle_id, expected_version, values, original
             )
-            db.commit()
-            return redirect(url_for("list_vehicles"))
+            if changed:
+                log_audit(
+                    db,
+                    action="UPDATE",
+                    table_name="vehicles",
+                    record_id=vehicle_id,
+                    user="demo_user",
+                    details=f"Updated vehicle ({', '.join(changed)})",
+                )
+            return current, changed
+
+        try:
+            current, changed = run_write_transaction(db, apply_edit)
         except sqlite3.IntegrityError as e:
             error = f"Error updating vehicle: {e}"
             vehicle = db.execute(
@@ -152,11 +512,26 @@ def edit_vehicle(vehicle_id):
             return render_template(
                 "vehicle_form.html",
                 vehicle=vehicle,
-                form_action=url_for("edit_vehicle", vehicle_id=vehicle_id),
+                original=loaded_values(vehicle, VEHICLE_FORM_FIELDS),
+                form_action=url_for(".edit_vehicle", vehicle_id=vehicle_id),
                 is_edit=True,
                 error=error,
             )
 
+        if current is None:
+            return "Vehicle not found", 404
+        if changed is None:
+            return render_template(
+                "vehicle_form.html",
+                vehicle=merged_form_row(current, values, original),
+                original=loaded_values(current, VEHICLE_FORM_FIELDS),
+                form_action=url_for(".edit_vehicle", vehicle_id=vehicle_id),
+                is_edit=True,
+                error=None,
+                conflicts=conflict_fields(current, values, original),
+            ), 409
+        return redirect(url_for(".list_vehicles"))
+
     vehicle = db.execute(
         "SELECT * FROM vehicles WHERE vehicle_id = ?",
         (vehicle_id,),
@@ -167,75 +542,241 @@ def edit_vehicle(vehicle_id):
     return render_template(
         "vehicle_form.html",
         vehicle=vehicle,
-        form_action=url_for("edit_vehicle", vehicle_id=vehicle_id),
+        original=loaded_values(vehicle, VEHICLE_FORM_FIELDS),
+        form_action=url_for(".edit_vehicle", vehicle_id=vehicle_id),
         is_edit=True,
         error=None,
     )
 
-@app.route("/vehicles/<vehicle_id>/delete", methods=["POST"])
+@bp.route("/vehicles/<vehicle_id>/delete", methods=["POST"])
 def delete_vehicle(vehicle_id):
     """
     Delete a vehicle.
-    We will prevent deletion if the vehicle has deliveries (to avoid FK errors).
+    We will prevent deletion if the vehicle has deliveries (to avoid FK errors),
+    including archived ones, which no foreign key protects.
     """
-    db = get_db()
+    def apply_delete(db):
+        # Checked under the write lock, so no delivery can be added in between.
+        count_row = db.execute(
+            "SELECT COUNT(*) AS cnt FROM deliveries WHERE vehicle_id = ?",
+            (vehicle_id,),
+        ).fetchone()
+        if count_row["cnt"] > 0:
+            return (
+                "Cannot delete vehicle with existing deliveries. "
+                "Reassign or delete deliveries first.",
+                400,
+            )
+        try:
+            archived = archived_delivery_count(db, vehicle_id)
+        except FileNotFoundError as e:
+            return f"Cannot delete vehicle: archive {e} is missing, so its archived deliveries cannot be checked.", 500
+        if archived > 0:
+            return (
+                f"Cannot delete vehicle with {archived} archived deliveries. "
+                "Archived deliveries keep their vehicle for reporting.",
+                400,
+            )
 
-    count_row = db.execute(
-        "SELECT COUNT(*) AS cnt FROM deliveries WHERE vehicle_id = ?",
-        (vehicle_id,),
-    ).fetchone()
-    if count_row["cnt"] > 0:
-        return (
-            "Cannot delete vehicle with existing deliveries. "
-            "Reassign or delete deliveries first.",
-            400,
+        db.execute(
+            "DELETE FROM vehicles WHERE vehicle_id = ?",
+            (vehicle_id,),
         )
+        log_audit(
+            db,
+            action="DELETE",
+            table_name="vehicles",
+            record_id=vehicle_id,
+            user="demo_user",
+            details="Deleted vehicle",
+        )
+        return None
 
-    db.execute(
-        "DELETE FROM vehicles WHERE vehicle_id = ?",
-        (vehicle_id,),
-    )
-    log_audit(
-        db,
-        action="DELETE",
-        table_name="vehicles",
-        record_id=vehicle_id,
-        user="demo_user",
-        details="Deleted vehicle",
-    )
-    db.commit()
-    return redirect(url_for("list_vehicles"))
+    refusal = run_write_transaction(get_db(), apply_delete)
+    if refusal is not None:
+        return refusal
+    return redirect(url_for(".list_vehicles"))
 
 # ---------- DELIVERIES CRUD ----------
-@app.route("/deliveries")
+DELIVERY_FORM_FIELDS = (
+    "vehicle_id",
+    "route_id",
+    "delivery_date",
+    "scheduled_time",
+    "delivery_time",
+    "customer_name",
+    "customer_address",
+    "status",
+)
+
+# ---------- DELIVERY TIERS ----------
+# Old closed deliveries live in yearly archive files (see archive.py).
+# SQLite allows 10 attached databases by default.
+MAX_ATTACHED_ARCHIVES = 8
+EARLIEST_DATE = "0000-01-01"
+LATEST_DATE = "9999-12-31"
+
+def read_date_range():
+    """
+    The optional ?from=YYYY-MM-DD&to=YYYY-MM-DD filter on lists and reports.
+    Raises ValueError for anything that is not an ISO date.
+    """
+    date_from = request.args.get("from") or None
+    date_to = request.args.get("to") or None
+    for value in (date_from, date_to):
+        if value is not None:
+            datetime.date.fromisoformat(value)
+    return date_from, date_to
+
+def date_range_conditions(column, date_from, date_to):
+    """
+    SQL conditions and parameters for the optional date range. A missing end
+    adds no condition, so an open range never becomes a placeholder bound
+    that the planner has to range-scan.
+    """
+    conditions, params = [], []
+    if date_from is not None:
+        conditions.append(f"{column} >= ?")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append(f"{column} <= ?")
+        params.append(date_to)
+    return conditions, params
+
+def delivery_schemas(db, date_from, date_to):
+    """
+    Decide which tiers a date range needs. Returns (schemas, archive_tiers):
+    schemas always starts with "main" and adds each archive whose dates
+    overlap the range, attached until the end of the request. A missing end
+    of the range is open; with no dates at all only the hot tier is read.
+    """
+    tiers = db.execute(
+        "SELECT year, path, min_date, max_date, row_count FROM archive_tiers ORDER BY year"
+    ).fetchall()
+    if date_from is None and date_to is None:
+        return ["main"], tiers
+
+    needed = [
+        tier for tier in tiers
+        if tier["max_date"] >= (date_from or EARLIEST_DATE)
+        and tier["min_date"] <= (date_to or LATEST_DATE)
+        and tier["year"].isdigit()
+    ]
+    if len(needed) > MAX_ATTACHED_ARCHIVES:
+        raise ValueError(
+            f"Date range spans {len(needed)} archived years; "
+            f"narrow it to at most {MAX_ATTACHED_ARCHIVES}."
+        )
+
+    base = os.path.dirname(os.path.abspath(current_app.config["DATABASE"]))
+    attached = g.setdefault("attached_archives", [])
+    schemas = ["main"]
+    for tier in needed:
+        schema = f"archive_{tier['year']}"
+        if schema not in attached:
+            db.execute(f"ATTACH DATABASE ? AS {schema}", (os.path.join(base, tier["path"]),))
+            attached.append(schema)
+        schemas.append(schema)
+    return schemas, tiers
+
+def archived_delivery_count(db, vehicle_id):
+    """
+    Number of archived deliveries for a vehicle, counted in each archive file
+    directly rather than through ATTACH, so any number of years works.
+    Raises FileNotFoundError if an archive listed in archive_tiers is missing,
+    since it then cannot be shown to be free of the vehicle.
+    """
+    base = os.path.dirname(os.path.abspath(current_app.config["DATABASE"]))
+    total = 0
+    for tier in db.execute("SELECT year, path FROM archive_tiers ORDER BY year").fetchall():
+        path = os.path.join(base, tier["path"])
+        if not os.path.exists(path):
+            raise FileNotFoundError(tier["path"])
+        archive = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            total += archive.execute(
+                "SELECT COUNT(*) FROM deliveries WHERE vehicle_id = ?",
+                (vehicle_id,),
+            ).fetchone()[0]
+        finally:
+            archive.close()
+    return total
+
+def merge_report_rows(results, key, sort_key):
+    """
+    Add up per-tier report rows that share a key, then sort them the same way
+    the single-tier SQL does.
+    """
+    merged = {}
+    for rows in results:
+        for row in rows:
+            item = merged.get(row[key])
+            if item is None:
+                merged[row[key]] = dict(row)
+            else:
+                item["total_deliveries"] += row["total_deliveries"]
+                item["completed_deliveries"] = (item["completed_deliveries"] or 0) + (row["completed_deliveries"] or 0)
+    return sorted(merged.values(), key=sort_key, reverse=True)
+
+def tier_context(date_from, date_to, schemas, tiers):
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "archive_years": [schema.split("_", 1)[1] for schema in schemas[1:]],
+        "archived_through": tiers[-1]["max_date"] if tiers else None,
+        "archived_rows": sum(tier["row_count"] for tier in tiers),
+    }
+
+@bp.route("/deliveries")
 def list_deliveries():
     """
-    List all deliveries, joined with vehicle and route info.
+    List deliveries, joined with vehicle and route info.
+    Archived deliveries are included only when ?from reaches into them.
     """
     db = get_db()
-    deliveries = db.execute(
-        """
-        SELECT d.delivery_id,
-               d.delivery_date,
-               d.status,
-               d.customer_name,
-               d.customer_address,
-               d.scheduled_time,
-               d.delivery_time,
-               v.vehicle_id,
-               v.type AS vehicle_type,
-               r.route_id,
-               r.origin,
-               r.destination
-        FROM deliveries d
-        JOIN vehicles v ON d.vehicle_id = v.vehicle_id
-        JOIN routes r   ON d.route_id   = r.route_id
-        ORDER BY d.delivery_date DESC, d.delivery_id DESC
-        """
-    ).fetchall()
-    return render_template("deliveries.html", deliveries=deliveries)
+    try:
+        date_from, date_to = read_date_range()
+        schemas, tiers = delivery_schemas(db, date_from, date_to)
+    except ValueError as e:
+        return f"Invalid date range: {e}", 400
+
+    conditions, params = date_range_conditions("d.delivery_date", date_from, date_to)
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    deliveries = []
+    for schema in schemas:
+        deliveries.extend(db.execute(
+            f"""
+            SELECT d.delivery_id,
+                   d.delivery_date,
+                   d.status,
+                   d.customer_name,
+                   d.customer_address,
+                   d.scheduled_time,
+                   d.delivery_time,
+                   v.vehicle_id,
+                   v.type AS vehicle_type,
+                   r.route_id,
+                   r.origin,
+                   r.destination,
+                   '{schema}' AS tier
+            FROM {schema}.deliveries d
+            JOIN vehicles v ON d.vehicle_id = v.vehicle_id
+            JOIN routes r   ON d.route_id   = r.route_id
+            {where}
+            ORDER BY d.delivery_date DESC, d.delivery_id DESC
+            """,
+            params,
+        ).fetchall())
+    if len(schemas) > 1:
+        deliveries.sort(key=lambda d: (d["delivery_date"], d["delivery_id"]), reverse=True)
+
+    return render_template(
+        "deliveries.html",
+        deliveries=deliveries,
+        **tier_context(date_from, date_to, schemas, tiers),
+    )
 
-@app.route("/deliveries/new", methods=["GET", "POST"])
+@bp.route("/deliveries/new", methods=["GET", "POST"])
 def create_delivery():
     """
     Create a new delivery record.
@@ -251,37 +792,42 @@ def create_delivery():
         customer_name = request.form.get("customer_name") or None
         customer_address = request.form.get("customer_address") or None
         status = request.form.get("status")
+        latitude, longitude = geocode(customer_address)
 
-        db.execute(
-            """
-            INSERT INTO deliveries (
-                vehicle_id, route_id, delivery_date,
-                scheduled_time, delivery_time,
-                customer_name, customer_address,
-                status
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                vehicle_id,
-                route_id,
-                delivery_date,
-                scheduled_time,
-                delivery_time,
-                customer_name,
-                customer_address,
-                status,
-            ),
-        )
-        log_audit(
-            db,
-            action="INSERT",
-            table_name="deliveries",
-            record_id="(auto)",  # delivery_id is autoincrement; you can fetch it if you want
-            user="demo_user",
-            details=f"Created delivery for {customer_name or 'unknown customer'}",
-        )
-        db.commit()
-        return redirect(url_for("list_deliveries"))
+        def apply_insert(db):
+            db.execute(
+                """
+                INSERT INTO deliveries (
+                    vehicle_id, route_id, delivery_date,
+                    scheduled_time, delivery_time,
+                    customer_name, customer_address,
+                    status, latitude, longitude
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    vehicle_id,
+                    route_id,
+                    delivery_date,
+                    scheduled_time,
+                    delivery_time,
+                    customer_name,
+                    customer_address,
+                    status,
+                    latitude,
+                    longitude,
+                ),
+            )
+            log_audit(
+                db,
+                action="INSERT",
+                table_name="deliveries",
+                record_id="(auto)",  # delivery_id is autoincrement; you can fetch it if you want
+                user="demo_user",
+                details=f"Created delivery for {customer_name or 'unknown customer'}",
+            )
+
+        run_write_transaction(db, apply_insert)
+        return redirect(url_for(".list_deliveries"))
 
     # GET: need vehicles and routes for dropdowns
     vehicles = db.execute(
@@ -296,24 +842,17 @@ def create_delivery():
         delivery=None,
         vehicles=vehicles,
         routes=routes,
-        form_action=url_for("create_delivery"),
+        form_action=url_for(".create_delivery"),
         is_edit=False,
         error=None,
     )
 
-@app.route("/deliveries/<int:delivery_id>/edit", methods=["GET", "POST"])
+@bp.route("/deliveries/<int:delivery_id>/edit", methods=["GET", "POST"])
 def edit_delivery(delivery_id):
     """
     Edit an existing delivery record.
     """
     db = get_db()
-    delivery = db.execute(
-        "SELECT * FROM deliveries WHERE delivery_id = ?",
-        (delivery_id,),
-    ).fetchone()
-
-    if delivery is None:
-        return "Delivery not found", 404
 
     if request.method == "POST":
         vehicle_id = request.form.get("vehicle_id")
@@ -324,42 +863,64 @@ def edit_delivery(delivery_id):
         customer_name = request.form.get("customer_name") or None
         customer_address = request.form.get("customer_address") or None
         status = request.form.get("status")
+        expected_version = parse_version(request.form.get("version"))
+        original = read_original(DELIVERY_FORM_FIELDS)
 
-        db.execute(
-            """
-            UPDATE deliveries
-            SET vehicle_id = ?,
-                route_id = ?,
-                delivery_date = ?,
-                scheduled_time = ?,
-                delivery_time = ?,
-                customer_name = ?,
-                customer_address = ?,
-                status = ?
-            WHERE delivery_id = ?
-            """,
-            (
-                vehicle_id,
-                route_id,
-                delivery_date,
-                scheduled_time,
-                delivery_time,
-                customer_name,
-                customer_address,
-                status,
-                delivery_id,
-            ),
-        )
-        log_audit(
-            db,
-            action="UPDATE",
-            table_name="deliveries",
-            record_id=delivery_id,
-            user="demo_user",
-            details="Updated delivery",
-        )
-        db.commit()
-        return redirect(url_for("list_deliveries"))
+        values = {
+            "vehicle_id": vehicle_id,
+            "route_id": route_id,
+            "delivery_date": delivery_date,
+            "scheduled_time": scheduled_time,
+            "delivery_time": delivery_time,
+            "customer_name": customer_name,
+            "customer_address": customer_address,
+            "status": status,
+        }
+
+        def apply_edit(db):
+            current, changed = update_versioned(
+                db, "deliveries", "delivery_id", delivery_id, expected_version, values, original
+            )
+            if changed and "customer_address" in changed:
+                # Coordinates follow the address; an address the gazetteer does
+                # not know keeps the coordinates the delivery already had.
+                latitude, longitude = geocode(customer_address)
+                if latitude is not None:
+                    db.execute(
+                        "UPDATE deliveries SET latitude = ?, longitude = ? WHERE delivery_id = ?",
+                        (latitude, longitude, delivery_id),
+                    )
+                    changed = changed + ["latitude", "longitude"]
+            if changed:
+                log_audit(
+                    db,
+                    action="UPDATE",
+                    table_name="deliveries",
+                    record_id=delivery_id,
+                    user="demo_user",
+                    details=f"Updated delivery ({', '.join(changed)})",
+                )
+            return current, changed
+
+        current, changed = run_write_transaction(db, apply_edit)
+        if current is None:
+            return "Delivery not found", 404
+        if changed is not None:
+            return redirect(url_for(".list_deliveries"))
+
+        # Someone else changed the same fields first: show the merge view.
+        delivery = merged_form_row(current, values, original)
+        loaded = current
+        conflicts = conflict_fields(current, values, original)
+    else:
+        delivery = db.execute(
+            "SELECT * FROM deliveries WHERE delivery_id = ?",
+            (delivery_id,),
+        ).fetchone()
+        if delivery is None:
+            return "Delivery not found", 404
+        loaded = delivery
+        conflicts = None
 
     # GET: dropdown data
     vehicles = db.execute(
@@ -372,79 +933,405 @@ def edit_delivery(delivery_id):
     return render_template(
         "delivery_form.html",
         delivery=delivery,
+        original=loaded_values(loaded, DELIVERY_FORM_FIELDS),
         vehicles=vehicles,
         routes=routes,
-        form_action=url_for("edit_delivery", delivery_id=delivery_id),
+        form_action=url_for(".edit_delivery", delivery_id=delivery_id),
         is_edit=True,
         error=None,
-    )
+        conflicts=conflicts,
+    ), 409 if conflicts is not None else 200
 
-@app.route("/deliveries/<int:delivery_id>/delete", methods=["POST"])
+@bp.route("/deliveries/<int:delivery_id>/delete", methods=["POST"])
 def delete_delivery(delivery_id):
     """
     Delete a delivery record.
     """
+    def apply_delete(db):
+        db.execute(
+            "DELETE FROM deliveries WHERE delivery_id = ?",
+            (delivery_id,),
+        )
+        log_audit(
+            db,
+            action="DELETE",
+            table_name="deliveries",
+            record_id=delivery_id,
+            user="demo_user",
+            details="Deleted delivery",
+        )
+
+    run_write_transaction(get_db(), apply_delete)
+    return redirect(url_for(".list_deliveries"))
+
+# ---------- DELIVERY LOCATIONS ----------
+# Searches start this wide and double until enough deliveries are found,
+# up to NEAREST_MAX_RADIUS_KM (a regional fleet never needs more). The box is
+# then narrowed by bisection while it holds more than NEAREST_BOX_SLACK times
+# the deliveries asked for.
+NEAREST_INITIAL_RADIUS_KM = 1.0
+NEAREST_MAX_RADIUS_KM = 500.0
+NEAREST_BISECT_STEPS = 12
+NEAREST_BOX_SLACK = 4
+MAX_LOCATION_RESULTS = 10000
+
+DELIVERY_LOCATION_COLUMNS = """
+    d.delivery_id,
+    d.vehicle_id,
+    d.route_id,
+    d.delivery_date,
+    d.status,
+    d.customer_name,
+    d.customer_address,
+    d.latitude,
+    d.longitude
+"""
+
+def location_filter(min_lat, max_lat, min_lon, max_lon, status=None):
+    """
+    WHERE clause and parameters selecting the deliveries in a box through the
+    delivery_locations R*Tree `l` joined to deliveries `d`.
+    """
+    sql = """
+        FROM delivery_locations l
+        JOIN deliveries d ON d.delivery_id = l.delivery_id
+        WHERE l.min_lat <= ? AND l.max_lat >= ?
+          AND l.min_lon <= ? AND l.max_lon >= ?
+    """
+    params = [max_lat, min_lat, max_lon, min_lon]
+    if status:
+        sql += " AND d.status = ?"
+        params.append(status)
+    return sql, params
+
+def deliveries_in_box(db, min_lat, max_lat, min_lon, max_lon, status=None, limit=None):
+    """
+    Deliveries whose coordinates fall inside the box, found through the
+    delivery_locations R*Tree. The R*Tree stores 32-bit floats, so the exact
+    coordinates are re-checked against the deliveries row.
+    """
+    where, params = location_filter(min_lat, max_lat, min_lon, max_lon, status)
+    sql = f"""
+        SELECT {DELIVERY_LOCATION_COLUMNS}
+        {where}
+          AND d.latitude BETWEEN ? AND ?
+          AND d.longitude BETWEEN ? AND ?
+    """
+    params += [min_lat, max_lat, min_lon, max_lon]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return db.execute(sql, params).fetchall()
+
+def count_in_box(db, min_lat, max_lat, min_lon, max_lon, status=None):
+    """
+    Number of deliveries in a box, counted inside SQLite without fetching rows.
+    """
+    if status:
+        where, params = location_filter(min_lat, max_lat, min_lon, max_lon, status)
+        return db.execute(f"SELECT COUNT(*) {where}", params).fetchone()[0]
+    return db.execute(
+        """
+        SELECT COUNT(*)
+        FROM delivery_locations
+        WHERE min_lat <= ? AND max_lat >= ?
+          AND min_lon <= ? AND max_lon >= ?
+        """,
+        (max_lat, min_lat, max_lon, min_lon),
+    ).fetchone()[0]
+
+def nearest_radius(db, latitude, longitude, count, status, max_radius):
+    """
+    Distance within which the `count` nearest deliveries lie, found with
+    COUNT(*) probes: double the box until it holds `count` deliveries, narrow
+    it by bisection, then take the count-th smallest distance inside it.
+    """
+    def probe(radius):
+        return count_in_box(db, *bounding_box(latitude, longitude, radius), status=status)
+
+    low, radius = 0.0, min(NEAREST_INITIAL_RADIUS_KM, max_radius)
+    found = probe(radius)
+    while found < count and radius < max_radius:
+        low, radius = radius, min(radius * 2, max_radius)
+        found = probe(radius)
+    if found < count:
+        return max_radius
+
+    for _ in range(NEAREST_BISECT_STEPS):
+        if found <= NEAREST_BOX_SLACK * count:
+            break
+        middle = (low + radius) / 2
+        inside = probe(middle)
+        if inside >= count:
+            radius, found = middle, inside
+        else:
+            low = middle
+
+    where, params = location_filter(*bounding_box(latitude, longitude, radius), status=status)
+    kth = db.execute(
+        f"""
+        SELECT MAX(distance_km) FROM (
+            SELECT haversine_km(?, ?, d.latitude, d.longitude) AS distance_km
+            {where}
+            ORDER BY distance_km
+            LIMIT ?
+        )
+        """,
+        [latitude, longitude, *params, count],
+    ).fetchone()[0]
+    if kth is None:
+        # Nothing left in the box (e.g. rows deleted since the probes).
+        return radius
+    return min(kth, max_radius)
+
+def nearest_deliveries(db, latitude, longitude, count, status=None, radius_km=None):
+    """
+    Up to `count` deliveries closest to a point, as (distance_km, row) pairs
+    sorted by distance. The search radius is settled with COUNT(*) probes
+    against the R*Tree (see nearest_radius), so rows are fetched only once,
+    for a circle that just holds the answer.
+    """
+    max_radius = NEAREST_MAX_RADIUS_KM if radius_km is None else min(radius_km, NEAREST_MAX_RADIUS_KM)
+    radius = nearest_radius(db, latitude, longitude, count, status, max_radius)
+    where, params = location_filter(*bounding_box(latitude, longitude, radius), status=status)
+    rows = db.execute(
+        f"""
+        SELECT {DELIVERY_LOCATION_COLUMNS},
+               haversine_km(?, ?, d.latitude, d.longitude) AS distance_km
+        {where}
+          AND distance_km <= ?
+        ORDER BY distance_km, d.delivery_id
+        LIMIT ?
+        """,
+        [latitude, longitude, *params, radius, count],
+    ).fetchall()
+    return [(row["distance_km"], row) for row in rows]
+
+def vehicle_position(db, vehicle_id):
+    """
+    A vehicle's last known position: the coordinates of its most recent
+    delivery that has been geocoded. Returns (None, None) if there is none.
+    """
+    row = db.execute(
+        """
+        SELECT latitude, longitude
+        FROM deliveries
+        WHERE vehicle_id = ? AND latitude IS NOT NULL
+        ORDER BY delivery_date DESC, delivery_id DESC
+        LIMIT 1
+        """,
+        (vehicle_id,),
+    ).fetchone()
+    return (row["latitude"], row["longitude"]) if row else (None, None)
+
+def location_json(row, distance_km=None):
+    item = dict(row)
+    if distance_km is not None:
+        item["distance_km"] = round(distance_km, 3)
+    return item
+
+@bp.route("/deliveries/within_box")
+def deliveries_within_box():
+    """
+    JSON list of deliveries inside a latitude/longitude box.
+    Query: min_lat, max_lat, min_lon, max_lon, optional status and limit.
+    """
+    try:
+        min_lat = float(request.args["min_lat"])
+        max_lat = float(request.args["max_lat"])
+        min_lon = float(request.args["min_lon"])
+        max_lon = float(request.args["max_lon"])
+        limit = int(request.args.get("limit", 1000))
+    except (KeyError, ValueError):
+        return jsonify(error="min_lat, max_lat, min_lon and max_lon are required numbers"), 400
+    if limit < 1:
+        return jsonify(error="limit must be at least 1"), 400
+    limit = min(limit, MAX_LOCATION_RESULTS)
+
+    rows = deliveries_in_box(
+        get_db(), min_lat, max_lat, min_lon, max_lon,
+        status=request.args.get("status") or None,
+        limit=limit,
+    )
+    return jsonify(deliveries=[location_json(row) for row in rows])
+
+@bp.route("/deliveries/nearest")
+def deliveries_nearest():
+    """
+    JSON list of the deliveries nearest to a point, closest first.
+    Query: lat and lon, or vehicle_id (its last known position); optional
+    n (default 10), status and radius_km, e.g.
+    /deliveries/nearest?vehicle_id=V004&status=pending&radius_km=5&n=100
+    """
     db = get_db()
-    db.execute(
-        "DELETE FROM deliveries WHERE delivery_id = ?",
-        (delivery_id,),
+    vehicle_id = request.args.get("vehicle_id")
+    try:
+        count = min(int(request.args.get("n", 10)), MAX_LOCATION_RESULTS)
+        radius_km = request.args.get("radius_km")
+        radius_km = float(radius_km) if radius_km else None
+        if vehicle_id:
+            latitude, longitude = vehicle_position(db, vehicle_id)
+            if latitude is None:
+                return jsonify(error=f"No known position for vehicle {vehicle_id}"), 404
+        else:
+            latitude = float(request.args["lat"])
+            longitude = float(request.args["lon"])
+    except (KeyError, ValueError):
+        return jsonify(error="lat and lon (or vehicle_id) are required; n and radius_km must be numbers"), 400
+    if count < 1:
+        return jsonify(error="n must be at least 1"), 400
+    if radius_km is not None and radius_km <= 0:
+        return jsonify(error="radius_km must be positive"), 400
+
+    results = nearest_deliveries(
+        db, latitude, longitude, count,
+        status=request.args.get("status") or None,
+        radius_km=radius_km,
     )
-    log_audit(
-        db,
-        action="DELETE",
-        table_name="deliveries",
-        record_id=delivery_id,
-        user="demo_user",
-        details="Deleted delivery",
+    return jsonify(
+        origin={"latitude": latitude, "longitude": longitude},
+        deliveries=[location_json(row, distance) for distance, row in results],
+    )
+
+# ---------- ROUTE NETWORK ----------
+def route_graph():
+    """
+    This process's current route network, or None while it is first being
+    built. Route changes it has not seen yet are applied in the background;
+    this request answers from the network as it stands.
+    """
+    graph = current_app.extensions["fleetflow_route_graph"]
+    graph.refresh_if_changed(get_db())
+    return graph.network
+
+@bp.route("/routes/path")
+def route_path():
+    """
+    JSON shortest chain of active routes between two hubs, e.g.
+    /routes/path?from=Main%20Depot&to=Airport
+    """
+    origin = (request.args.get("from") or "").strip()
+    destination = (request.args.get("to") or "").strip()
+    if not origin or not destination:
+        return jsonify(error="from and to are required"), 400
+
+    network = route_graph()
+    if network is None:
+        return jsonify(error="The route network is still loading. Please try again in a moment."), 503
+    result = network.shortest_path(origin, destination)
+    if result is None:
+        return jsonify(error=f"No active route path from {origin} to {destination}"), 404
+
+    distance_km, path = result
+    legs = [
+        {"route_id": route_id, "origin": leg_origin, "destination": leg_destination, "distance_km": leg_distance}
+        for route_id, leg_origin, leg_destination, leg_distance in path
+    ]
+    return jsonify(
+        origin=origin,
+        destination=destination,
+        distance_km=round(distance_km, 3),
+        hops=len(legs),
+        legs=legs,
     )
-    db.commit()
-    return redirect(url_for("list_deliveries"))
 
 # ---------- REPORTS ----------
-@app.route("/reports/vehicle_utilization")
+@bp.route("/reports/vehicle_utilization")
 def vehicle_utilization_report():
     """
     Show how many deliveries each vehicle has handled.
     """
     db = get_db()
-    rows = db.execute(
-        """
-        SELECT v.vehicle_id,
-               v.type AS vehicle_type,
-               v.status AS vehicle_status,
-               COUNT(d.delivery_id) AS total_deliveries,
-               SUM(CASE WHEN d.status = 'completed' THEN 1 ELSE 0 END) AS completed_deliveries
-        FROM vehicles v
-        LEFT JOIN deliveries d ON v.vehicle_id = d.vehicle_id
-        GROUP BY v.vehicle_id, v.type, v.status
-        ORDER BY completed_deliveries DESC, total_deliveries DESC;
-        """
-    ).fetchall()
-    return render_template("report_vehicle_utilization.html", rows=rows)
+    try:
+        date_from, date_to = read_date_range()
+        schemas, tiers = delivery_schemas(db, date_from, date_to)
+    except ValueError as e:
+        return f"Invalid date range: {e}", 400
 
-@app.route("/reports/deliveries_per_route")
+    conditions, params = date_range_conditions("d.delivery_date", date_from, date_to)
+    dates = "".join(f" AND {condition}" for condition in conditions)
+    results = [
+        db.execute(
+            f"""
+            SELECT v.vehicle_id,
+                   v.type AS vehicle_type,
+                   v.status AS vehicle_status,
+                   COUNT(d.delivery_id) AS total_deliveries,
+                   SUM(CASE WHEN d.status = 'completed' THEN 1 ELSE 0 END) AS completed_deliveries
+            FROM vehicles v
+            LEFT JOIN {schema}.deliveries d ON v.vehicle_id = d.vehicle_id{dates}
+            GROUP BY v.vehicle_id, v.type, v.status
+            ORDER BY completed_deliveries DESC, total_deliveries DESC;
+            """,
+            params,
+        ).fetchall()
+        for schema in schemas
+    ]
+    rows = results[0] if len(results) == 1 else merge_report_rows(
+        results,
+        key="vehicle_id",
+        sort_key=lambda r: (r["completed_deliveries"] or 0, r["total_deliveries"]),
+    )
+    return render_template(
+        "report_vehicle_utilization.html",
+        rows=rows,
+        **tier_context(date_from, date_to, schemas, tiers),
+    )
+
+@bp.route("/reports/deliveries_per_route")
 def deliveries_per_route_report():
     """
     Show how many deliveries are associated with each route.
     """
     db = get_db()
-    rows = db.execute(
-        """
-        SELECT r.route_id,
-               r.origin,
-               r.destination,
-               COUNT(d.delivery_id) AS total_deliveries,
-               SUM(CASE WHEN d.status = 'completed' THEN 1 ELSE 0 END) AS completed_deliveries
-        FROM routes r
-        LEFT JOIN deliveries d ON r.route_id = d.route_id
-        GROUP BY r.route_id, r.origin, r.destination
-        ORDER BY total_deliveries DESC, completed_deliveries DESC;
-        """
-    ).fetchall()
-    return render_template("report_deliveries_per_route.html", rows=rows)
+    try:
+        date_from, date_to = read_date_range()
+        schemas, tiers = delivery_schemas(db, date_from, date_to)
+    except ValueError as e:
+        return f"Invalid date range: {e}", 400
+
+    conditions, params = date_range_conditions("d.delivery_date", date_from, date_to)
+    dates = "".join(f" AND {condition}" for condition in conditions)
+    results = [
+        db.execute(
+            f"""
+            SELECT r.route_id,
+                   r.origin,
+                   r.destination,
+                   COUNT(d.delivery_id) AS total_deliveries,
+                   SUM(CASE WHEN d.status = 'completed' THEN 1 ELSE 0 END) AS completed_deliveries
+            FROM routes r
+            LEFT JOIN {schema}.deliveries d ON r.route_id = d.route_id{dates}
+            GROUP BY r.route_id, r.origin, r.destination
+            ORDER BY total_deliveries DESC, completed_deliveries DESC;
+            """,
+            params,
+        ).fetchall()
+        for schema in schemas
+    ]
+    rows = results[0] if len(results) == 1 else merge_report_rows(
+        results,
+        key="route_id",
+        sort_key=lambda r: (r["total_deliveries"], r["completed_deliveries"] or 0),
+    )
+    return render_template(
+        "report_deliveries_per_route.html",
+        rows=rows,
+        **tier_context(date_from, date_to, schemas, tiers),
+    )
 
 # ---------- MAINTENANCE LOGS CRUD ----------
-@app.route("/maintenance")
+MAINTENANCE_FORM_FIELDS = (
+    "vehicle_id",
+    "service_date",
+    "service_type",
+    "description",
+    "odometer_at_service",
+    "vendor",
+    "cost",
+)
+
+@bp.route("/maintenance")
 def list_maintenance():
     """
     List all maintenance logs, joined with vehicle info.
@@ -468,7 +1355,7 @@ def list_maintenance():
     ).fetchall()
     return render_template("maintenance_logs.html", logs=logs)
 
-@app.route("/maintenance/new", methods=["GET", "POST"])
+@bp.route("/maintenance/new", methods=["GET", "POST"])
 def create_maintenance():
     """
     Create a new maintenance log entry.
@@ -487,33 +1374,35 @@ def create_maintenance():
         odometer_at_service = int(odometer_raw) if odometer_raw else None
         cost = float(cost_raw) if cost_raw else None
 
-        db.execute(
-            """
-            INSERT INTO maintenance_logs (
-                vehicle_id, service_date, description,
-                service_type, odometer_at_service, vendor, cost
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                vehicle_id,
-                service_date,
-                description,
-                service_type,
-                odometer_at_service,
-                vendor,
-                cost,
-            ),
-        )
-        log_audit(
-            db,
-            action="INSERT",
-            table_name="maintenance_logs",
-            record_id="(auto)",
-            user="demo_user",
-            details=f"Created maintenance log for vehicle {vehicle_id}",
-        )
-        db.commit()
-        return redirect(url_for("list_maintenance"))
+        def apply_insert(db):
+            db.execute(
+                """
+                INSERT INTO maintenance_logs (
+                    vehicle_id, service_date, description,
+                    service_type, odometer_at_service, vendor, cost
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    vehicle_id,
+                    service_date,
+                    description,
+                    service_type,
+                    odometer_at_service,
+                    vendor,
+                    cost,
+                ),
+            )
+            log_audit(
+                db,
+                action="INSERT",
+                table_name="maintenance_logs",
+                record_id="(auto)",
+                user="demo_user",
+                details=f"Created maintenance log for vehicle {vehicle_id}",
+            )
+
+        run_write_transaction(db, apply_insert)
+        return redirect(url_for(".list_maintenance"))
 
     # GET: load active vehicles for dropdown
     vehicles = db.execute(
@@ -524,24 +1413,17 @@ def create_maintenance():
         "maintenance_form.html",
         log=None,
         vehicles=vehicles,
-        form_action=url_for("create_maintenance"),
+        form_action=url_for(".create_maintenance"),
         is_edit=False,
         error=None,
     )
 
-@app.route("/maintenance/<int:log_id>/edit", methods=["GET", "POST"])
+@bp.route("/maintenance/<int:log_id>/edit", methods=["GET", "POST"])
 def edit_maintenance(log_id):
     """
     Edit an existing maintenance log.
     """
     db = get_db()
-    log = db.execute(
-        "SELECT * FROM maintenance_logs WHERE log_id = ?",
-        (log_id,),
-    ).fetchone()
-
-    if log is None:
-        return "Maintenance log not found", 404
 
     if request.method == "POST":
         vehicle_id = request.form.get("vehicle_id")
@@ -554,40 +1436,53 @@ def edit_maintenance(log_id):
 
         odometer_at_service = int(odometer_raw) if odometer_raw else None
         cost = float(cost_raw) if cost_raw else None
+        expected_version = parse_version(request.form.get("version"))
+        original = read_original(MAINTENANCE_FORM_FIELDS)
 
-        db.execute(
-            """
-            UPDATE maintenance_logs
-            SET vehicle_id = ?,
-                service_date = ?,
-                service_type = ?,
-                description = ?,
-                odometer_at_service = ?,
-                vendor = ?,
-                cost = ?
-            WHERE log_id = ?
-            """,
-            (
-                vehicle_id,
-                service_date,
-                service_type,
-                description,
-                odometer_at_service,
-                vendor,
-                cost,
-                log_id,
-            ),
-        )
-        log_audit(
-            db,
-            action="UPDATE",
-            table_name="maintenance_logs",
-            record_id=log_id,
-            user="demo_user",
-            details=f"Updated maintenance log {log_id}",
-        )
-        db.commit()
-        return redirect(url_for("list_maintenance"))
+        values = {
+            "vehicle_id": vehicle_id,
+            "service_date": service_date,
+            "service_type": service_type,
+            "description": description,
+            "odometer_at_service": odometer_at_service,
+            "vendor": vendor,
+            "cost": cost,
+        }
+
+        def apply_edit(db):
+            current, changed = update_versioned(
+                db, "maintenance_logs", "log_id", log_id, expected_version, values, original
+            )
+            if changed:
+                log_audit(
+                    db,
+                    action="UPDATE",
+                    table_name="maintenance_logs",
+                    record_id=log_id,
+                    user="demo_user",
+                    details=f"Updated maintenance log {log_id} ({', '.join(changed)})",
+                )
+            return current, changed
+
+        current, changed = run_write_transaction(db, apply_edit)
+        if current is None:
+            return "Maintenance log not found", 404
+        if changed is not None:
+            return redirect(url_for(".list_maintenance"))
+
+        # Someone else changed the same fields first: show the merge view.
+        log = merged_form_row(current, values, original)
+        loaded = current
+        conflicts = conflict_fields(current, values, original)
+    else:
+        log = db.execute(
+            "SELECT * FROM maintenance_logs WHERE log_id = ?",
+            (log_id,),
+        ).fetchone()
+        if log is None:
+            return "Maintenance log not found", 404
+        loaded = log
+        conflicts = None
 
     vehicles = db.execute(
         "SELECT vehicle_id, type FROM vehicles WHERE status != 'retired' ORDER BY vehicle_id"
@@ -596,35 +1491,76 @@ def edit_maintenance(log_id):
     return render_template(
         "maintenance_form.html",
         log=log,
+        original=loaded_values(loaded, MAINTENANCE_FORM_FIELDS),
         vehicles=vehicles,
-        form_action=url_for("edit_maintenance", log_id=log_id),
+        form_action=url_for(".edit_maintenance", log_id=log_id),
         is_edit=True,
         error=None,
-    )
+        conflicts=conflicts,
+    ), 409 if conflicts is not None else 200
 
-@app.route("/maintenance/<int:log_id>/delete", methods=["POST"])
+@bp.route("/maintenance/<int:log_id>/delete", methods=["POST"])
 def delete_maintenance(log_id):
     """
     Delete a maintenance log entry.
     """
+    def apply_delete(db):
+        db.execute(
+            "DELETE FROM maintenance_logs WHERE log_id = ?",
+            (log_id,),
+        )
+        log_audit(
+            db,
+            action="DELETE",
+            table_name="maintenance_logs",
+            record_id=log_id,
+            user="demo_user",
+            details=f"Deleted maintenance log {log_id}",
+        )
+
+    run_write_transaction(get_db(), apply_delete)
+    return redirect(url_for(".list_maintenance"))
+
+# ---------- DATA INTEGRITY ----------
+@bp.route("/integrity")
+def integrity_report():
+    """
+    Show findings recorded by integrity_scan.py and how far each table's scan has got.
+    """
     db = get_db()
-    db.execute(
-        "DELETE FROM maintenance_logs WHERE log_id = ?",
-        (log_id,),
-    )
-    log_audit(
-        db,
-        action="DELETE",
-        table_name="maintenance_logs",
-        record_id=log_id,
-        user="demo_user",
-        details=f"Deleted maintenance log {log_id}",
+    summary = db.execute(
+        """
+        SELECT check_name, COUNT(*) AS findings
+        FROM integrity_findings
+        GROUP BY check_name
+        ORDER BY check_name
+        """
+    ).fetchall()
+    scan_state = db.execute(
+        """
+        SELECT table_name, last_rowid, updated_at, completed_at
+        FROM integrity_scan_state
+        ORDER BY table_name
+        """
+    ).fetchall()
+    findings = db.execute(
+        """
+        SELECT finding_id, check_name, table_name, record_id, details, found_at
+        FROM integrity_findings
+        ORDER BY found_at DESC
+        LIMIT 500
+        """
+    ).fetchall()
+    return render_template(
+        "integrity_report.html",
+        summary=summary,
+        scan_state=scan_state,
+        findings=findings,
+        descriptions=CHECK_DESCRIPTIONS,
     )
-    db.commit()
-    return redirect(url_for("list_maintenance"))
 
 # ---------- AUDITS ----------
-@app.route("/audit")
+@bp.route("/audit")
 def view_audit_log():
     """
     Show recent audit log entries (most recent first).
@@ -646,5 +1582,35 @@ def view_audit_log():
     ).fetchall()
     return render_template("audit_log.html", rows=rows)
 
+# ---------- HEALTH ----------
+@bp.route("/healthz")
+def liveness():
+    """
+    Liveness probe: the worker process is up and serving requests.
+    """
+    return jsonify(status="ok")
+
+@bp.route("/readyz")
+def readiness():
+    """
+    Readiness probe: the database is reachable and has the FleetFlow schema.
+    """
+    try:
+        db = get_db()
+        found = db.execute(
+            "SELECT COUNT(*) AS cnt FROM sqlite_master WHERE type = 'table' AND name IN "
+            "('vehicles', 'routes', 'deliveries', 'maintenance_logs', 'audit_log')"
+        ).fetchone()["cnt"]
+    except sqlite3.Error as e:
+        return jsonify(status="unavailable", error=str(e)), 503
+    if found < 5:
+        return jsonify(status="unavailable", error="schema not initialized"), 503
+    return jsonify(
+        status="ready",
+        startup_ms=round(current_app.config["STARTUP_SECONDS"] * 1000, 1),
+    )
+
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    # Local development server. See wsgi.py for multi-worker serving.
+    debug = parse_setting(os.environ.get(ENV_PREFIX + "DEBUG", "1"), True)
+    create_app().run(debug=debug)
\ No newline at end of file
@@ -0,0 +1,227 @@
+"""
+Hot/cold tiering for deliveries.
+
+Completed and cancelled deliveries older than N days are moved out of the hot
+database into one SQLite file per year (archive/deliveries_<year>.db, next to
+the hot database). The app ATTACHes an archive only when a requested date
+range reaches into it, so everyday lists and reports touch only the hot file.
+
+    python archive.py --older-than-days 90
+    python archive.py --older-than-days 365 --chunk-size 2000 --pause 0.05
+
+Rows are copied into the archive and committed before they are deleted from
+the hot database, so an interruption can leave a row briefly in both tiers
+but never in neither. Re-running the job finishes the move. A row that was
+edited between the copy and the delete (its version changed, or it was
+reopened) stays in the hot database and its archive copy is dropped; the next
+chunk picks it up again if it still qualifies.
+"""
+
+import argparse
+import datetime
+import os
+import sqlite3
+import time
+
+DB_PATH = "fleetflow.db"
+ARCHIVE_DIR = "archive"
+CLOSED_STATUSES = ("completed", "cancelled")
+
+DELIVERY_COLUMNS = [
+    "delivery_id",
+    "vehicle_id",
+    "route_id",
+    "delivery_date",
+    "scheduled_time",
+    "delivery_time",
+    "customer_name",
+    "customer_address",
+    "status",
+    "version",
+    "latitude",
+    "longitude",
+]
+
+# Archive files hold read-only copies of deliveries. There are no foreign keys
+# because vehicles and routes live in the hot database.
+ARCHIVE_DDL = """
+CREATE TABLE IF NOT EXISTS deliveries (
+    delivery_id INTEGER PRIMARY KEY,
+    vehicle_id TEXT NOT NULL,
+    route_id   TEXT NOT NULL,
+    delivery_date TEXT NOT NULL, -- YYYY-MM-DD
+    scheduled_time TEXT,
+    delivery_time TEXT,
+    customer_name TEXT,
+    customer_address TEXT,
+    status TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    latitude REAL,
+    longitude REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_deliveries_vehicle_id ON deliveries(vehicle_id);
+CREATE INDEX IF NOT EXISTS idx_deliveries_route_id ON deliveries(route_id);
+CREATE INDEX IF NOT EXISTS idx_deliveries_date ON deliveries(delivery_date);
+"""
+
+def archive_relative_path(year):
+    """
+    Path of a year's archive, relative to the hot database's directory.
+    This is what archive_tiers stores.
+    """
+    return os.path.join(ARCHIVE_DIR, f"deliveries_{year}.db")
+
+def resolve_archive_path(db_path, relative_path):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), relative_path)
+
+def ensure_archive(db_path, year):
+    relative = archive_relative_path(year)
+    path = resolve_archive_path(db_path, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(ARCHIVE_DDL)
+    conn.close()
+    return relative, path
+
+def move_chunk(conn, db_path, year, delivery_ids):
+    """
+    Move one chunk of deliveries (all from the same year) to that year's
+    archive. Returns the number of rows removed from the hot database.
+    """
+    relative, path = ensure_archive(db_path, year)
+    columns = ", ".join(DELIVERY_COLUMNS)
+    placeholders = ", ".join("?" for _ in delivery_ids)
+    closed = ", ".join("?" for _ in CLOSED_STATUSES)
+
+    conn.execute("ATTACH DATABASE ? AS archive", (path,))
+    try:
+        # 1) Copy and commit on the archive side first.
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            f"""
+            INSERT OR REPLACE INTO archive.deliveries ({columns})
+            SELECT {columns} FROM main.deliveries
+            WHERE delivery_id IN ({placeholders})
+            """,
+            delivery_ids,
+        )
+        conn.commit()
+
+        # 2) Then drop the rows from the hot tier, but only those still closed
+        #    and at the version that was copied. Anything saved in between
+        #    keeps its hot row, and its now stale archive copy is removed.
+        conn.execute("BEGIN IMMEDIATE")
+        moved = conn.execute(
+            f"""
+            DELETE FROM main.deliveries
+            WHERE delivery_id IN ({placeholders})
+              AND status IN ({closed})
+              AND version = (
+                  SELECT a.version FROM archive.deliveries a
+                  WHERE a.delivery_id = main.deliveries.delivery_id
+              )
+            """,
+            (*delivery_ids, *CLOSED_STATUSES),
+        ).rowcount
+        conn.execute(
+            f"""
+            DELETE FROM archive.deliveries
+            WHERE delivery_id IN ({placeholders})
+              AND delivery_id IN (SELECT delivery_id FROM main.deliveries)
+            """,
+            delivery_ids,
+        )
+        span = conn.execute(
+            f"""
+            SELECT MIN(delivery_date), MAX(delivery_date)
+            FROM archive.deliveries
+            WHERE delivery_id IN ({placeholders})
+            """,
+            delivery_ids,
+        ).fetchone()
+        if not moved:
+            conn.commit()
+            return 0
+        conn.execute(
+            """
+            INSERT INTO archive_tiers (year, path, min_date, max_date, row_count, archived_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(year) DO UPDATE SET
+                min_date = MIN(min_date, excluded.min_date),
+                max_date = MAX(max_date, excluded.max_date),
+                row_count = row_count + excluded.row_count,
+                archived_at = excluded.archived_at
+            """,
+            (year, relative, span[0], span[1], moved, datetime.datetime.utcnow().isoformat()),
+        )
+        conn.commit()
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        conn.execute("DETACH DATABASE archive")
+    return moved
+
+def run_archive(db_path=DB_PATH, older_than_days=90, chunk_size=1000, pause_seconds=0.0, today=None):
+    """
+    Move closed deliveries dated before today - older_than_days into the
+    per-year archives. Returns the number of deliveries moved.
+    """
+    today = today or datetime.date.today()
+    cutoff = (today - datetime.timedelta(days=older_than_days)).isoformat()
+    conn = sqlite3.connect(db_path, timeout=5.0, isolation_level=None)
+    conn.execute("PRAGMA foreign_keys = ON;")
+
+    moved = 0
+    while True:
+        rows = conn.execute(
+            f"""
+            SELECT delivery_id, substr(delivery_date, 1, 4) AS year
+            FROM deliveries
+            WHERE delivery_date < ?
+              AND status IN ({", ".join("?" for _ in CLOSED_STATUSES)})
+            ORDER BY delivery_date
+            LIMIT ?
+            """,
+            (cutoff, *CLOSED_STATUSES, chunk_size),
+        ).fetchall()
+        if not rows:
+            break
+
+        by_year = {}
+        for delivery_id, year in rows:
+            by_year.setdefault(year, []).append(delivery_id)
+        for year, delivery_ids in sorted(by_year.items()):
+            moved += move_chunk(conn, db_path, year, delivery_ids)
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+    if moved:
+        conn.execute(
+            """
+            INSERT INTO audit_log (timestamp, action, table_name, record_id, details, user)
+            VALUES (?, 'ARCHIVE', 'deliveries', '(batch)', ?, 'system')
+            """,
+            (
+                datetime.datetime.utcnow().isoformat(),
+                f"Archived {moved} closed deliveries dated before {cutoff}",
+            ),
+        )
+    conn.close()
+    return moved
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move old closed deliveries into yearly archives")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--older-than-days", type=int, default=90)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="deliveries per transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between chunks")
+    args = parser.parse_args(argv)
+
+    moved = run_archive(args.db, args.older_than_days, args.chunk_size, args.pause)
+    print(f"Archived {moved} deliveries.")
+
+if __name__ == "__main__":
+    main()
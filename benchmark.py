@@ -0,0 +1,733 @@
+"""
+Mixed-workload benchmark and query-plan regression check for FleetFlow.
+
+For each requested size, a fresh database is generated, the real app is built
+with create_app() against it, and a weighted mix of list views, reports, form
+opens, CRUD writes and spatial lookups is driven through Flask's test client. Latency
+percentiles and throughput are reported per endpoint.
+
+Every SQL statement the app issues during the run is captured and checked
+with EXPLAIN QUERY PLAN. A "SCAN <table>" step reads the whole table (or
+the whole of one of its indexes), and so can a SEARCH on a range with no
+equality and no LIMIT; either fails the run unless the statement is listed in
+FULL_SCAN_EXEMPT. The run also fails on any request that returns a
+5xx or a 4xx the workload does not expect.
+
+Usage:
+    python benchmark.py --sizes 1000,10000 --requests 500 --threads 4
+    python benchmark.py --compare benchmark_results_old.json
+
+Results are written as JSON (--output) so runs can be compared later.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from app import ConnectionPool, create_app, register_sql_functions
+from archive import run_archive
+from fleet_setup import init_db
+from migrate import run_migrations
+
+DEFAULT_MIX = {"list": 30, "report": 15, "form": 20, "write": 25, "spatial": 10}
+
+VEHICLE_TYPES = ["van", "truck"]
+VEHICLE_STATUSES = ["active", "active", "active", "maintenance", "retired"]
+DELIVERY_STATUSES = ["pending", "in_transit", "completed", "completed", "cancelled"]
+HUBS = ["Main Depot", "North Hub", "South Hub", "Downtown", "Industrial Park", "Airport"]
+SERVICE_TYPES = ["oil_change", "brake_service", "inspection", "tire_service", "engine_repair"]
+
+# Generated deliveries span DATA_DAYS from DATA_START. Closed deliveries older
+# than ARCHIVE_AFTER_DAYS (counted from the end of that span) are archived.
+DATA_START = datetime.date(2024, 1, 1)
+DATA_DAYS = 700
+ARCHIVE_AFTER_DAYS = 365
+
+# Generated deliveries are scattered over roughly 40 x 40 km around this point.
+CENTER_LAT, CENTER_LON = 49.6935, -112.8418
+SPREAD_DEG = 0.18
+
+# ---------- DATA GENERATION ----------
+def generate_database(path, deliveries, seed=0):
+    """
+    Create a FleetFlow database at path with roughly `deliveries` deliveries,
+    plus vehicles, routes, maintenance logs and audit entries scaled to match.
+    Returns the row count of each table.
+    """
+    rng = random.Random(seed)
+    init_db(path)
+    run_migrations(path)
+    conn = sqlite3.connect(path)
+
+    n_vehicles = max(5, deliveries // 200)
+    n_routes = max(3, deliveries // 500)
+    n_maintenance = max(5, deliveries // 10)
+    start = DATA_START
+
+    conn.executemany(
+        """
+        INSERT INTO vehicles (
+            vehicle_id, type, capacity, status, license_plate, current_odometer
+        ) VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (
+            (
+                f"V{i:05d}",
+                rng.choice(VEHICLE_TYPES),
+                rng.randrange(800, 4000, 100),
+                rng.choice(VEHICLE_STATUSES),
+                f"PLT-{i:06d}",
+                rng.randrange(10000, 250000),
+            )
+            for i in range(1, n_vehicles + 1)
+        ),
+    )
+    conn.executemany(
+        """
+        INSERT INTO routes (route_id, origin, destination, distance_km, is_active)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (
+            (
+                f"R{i:05d}",
+                rng.choice(HUBS),
+                rng.choice(HUBS),
+                round(rng.uniform(2, 80), 1),
+                1 if rng.random() < 0.85 else 0,
+            )
+            for i in range(1, n_routes + 1)
+        ),
+    )
+
+    def delivery_row(i):
+        day = start + datetime.timedelta(days=rng.randrange(DATA_DAYS))
+        scheduled = f"{day.isoformat()}T{rng.randrange(7, 18):02d}:00"
+        status = rng.choice(DELIVERY_STATUSES)
+        delivered = scheduled[:-2] + "45" if status == "completed" else None
+        return (
+            f"V{rng.randrange(1, n_vehicles + 1):05d}",
+            f"R{rng.randrange(1, n_routes + 1):05d}",
+            day.isoformat(),
+            scheduled,
+            delivered,
+            f"Customer {i}",
+            f"{rng.randrange(1, 999)} Main St",
+            status,
+            round(CENTER_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG), 6),
+            round(CENTER_LON + rng.uniform(-SPREAD_DEG, SPREAD_DEG) * 1.5, 6),
+        )
+
+    conn.executemany(
+        """
+        INSERT INTO deliveries (
+            vehicle_id, route_id, delivery_date,
+            scheduled_time, delivery_time,
+            customer_name, customer_address,
+            status, latitude, longitude
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (delivery_row(i) for i in range(deliveries)),
+    )
+    conn.executemany(
+        """
+        INSERT INTO maintenance_logs (
+            vehicle_id, service_date, description,
+            service_type, odometer_at_service, vendor, cost
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            (
+                f"V{rng.randrange(1, n_vehicles + 1):05d}",
+                (start + datetime.timedelta(days=rng.randrange(DATA_DAYS))).isoformat(),
+                "Routine service",
+                rng.choice(SERVICE_TYPES),
+                rng.randrange(10000, 250000),
+                "Benchmark Garage",
+                round(rng.uniform(50, 1500), 2),
+            )
+            for _ in range(n_maintenance)
+        ),
+    )
+    conn.executemany(
+        """
+        INSERT INTO audit_log (timestamp, action, table_name, record_id, details, user)
+        VALUES (?, 'INSERT', 'deliveries', ?, 'Generated', 'benchmark')
+        """,
+        (
+            (f"{(start + datetime.timedelta(minutes=i)).isoformat()}T00:00:00", str(i))
+            for i in range(deliveries)
+        ),
+    )
+    conn.commit()
+
+    conn.close()
+
+    archived = run_archive(
+        path,
+        older_than_days=ARCHIVE_AFTER_DAYS,
+        today=start + datetime.timedelta(days=DATA_DAYS),
+    )
+
+    conn = sqlite3.connect(path)
+    counts = {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ("vehicles", "routes", "deliveries", "maintenance_logs", "audit_log")
+    }
+    counts["archived_deliveries"] = archived
+    conn.close()
+    return counts
+
+# ---------- WORKLOAD ----------
+# 4xx statuses that are a normal outcome for an endpoint; any other 4xx is
+# counted as an error. Concurrent clients can save over each other's edits.
+EXPECTED_CLIENT_ERRORS = {
+    "GET /routes/path": {404},  # generated routes do not connect every pair of hubs
+    "POST /deliveries/<id>/edit": {409},
+    "POST /vehicles/<id>/edit": {409},
+    "POST /maintenance/<id>/edit": {409},
+}
+
+class Workload:
+    """
+    The operations a simulated dispatcher performs, grouped by category.
+    Each operation returns (endpoint_name, response).
+    """
+
+    def __init__(self, db_path, seed):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        lookup = sqlite3.connect(db_path, check_same_thread=False)
+        self.vehicle_ids = [r[0] for r in lookup.execute("SELECT vehicle_id FROM vehicles")]
+        self.route_ids = [r[0] for r in lookup.execute("SELECT route_id FROM routes")]
+        # Archived deliveries are no longer in the main table, so pick from the ids that are.
+        self.delivery_ids = [r[0] for r in lookup.execute("SELECT delivery_id FROM deliveries")]
+        self.max_delivery_id = lookup.execute("SELECT MAX(delivery_id) FROM deliveries").fetchone()[0]
+        self.max_log_id = lookup.execute("SELECT MAX(log_id) FROM maintenance_logs").fetchone()[0]
+        lookup.close()
+        self.lookup = sqlite3.connect(db_path, check_same_thread=False)
+        self.created_vehicles = []
+        self.next_vehicle = 0
+        self.categories = {
+            "list": [
+                self.list_vehicles,
+                self.list_deliveries,
+                self.list_archived_deliveries,
+                self.list_maintenance,
+                self.audit_log,
+            ],
+            "report": [
+                self.vehicle_utilization,
+                self.deliveries_per_route,
+                self.archived_route_report,
+                self.integrity_report,
+                self.route_path,
+            ],
+            "form": [
+                self.open_vehicle_form,
+                self.open_delivery_form,
+                self.open_maintenance_form,
+                self.open_new_delivery_form,
+                self.open_new_maintenance_form,
+            ],
+            "write": [
+                self.create_delivery,
+                self.edit_delivery,
+                self.edit_vehicle,
+                self.create_vehicle,
+                self.delete_vehicle,
+                self.create_maintenance,
+                self.edit_maintenance,
+                self.delete_delivery,
+            ],
+            "spatial": [self.deliveries_within_box, self.nearest_to_point, self.nearest_to_vehicle],
+        }
+
+    def pick(self, items):
+        with self.lock:
+            return self.rng.choice(items)
+
+    def version(self, table, key_column, key):
+        with self.lock:
+            row = self.lookup.execute(
+                f"SELECT version FROM {table} WHERE {key_column} = ?", (key,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def delivery_form(self):
+        return {
+            "vehicle_id": self.pick(self.vehicle_ids),
+            "route_id": self.pick(self.route_ids),
+            "delivery_date": "2025-06-01",
+            "scheduled_time": "2025-06-01T09:00",
+            "delivery_time": "",
+            "customer_name": "Benchmark Customer",
+            "customer_address": f"{self.pick(range(1, 999))} Main St",
+            "status": self.pick(DELIVERY_STATUSES[:3]),
+        }
+
+    def maintenance_form(self):
+        return {
+            "vehicle_id": self.pick(self.vehicle_ids),
+            "service_date": "2025-06-01",
+            "service_type": self.pick(SERVICE_TYPES),
+            "description": "Benchmark service",
+            "odometer_at_service": str(self.pick(range(10000, 250000))),
+            "vendor": "Benchmark Garage",
+            "cost": "99.50",
+        }
+
+    def list_vehicles(self, client):
+        return "GET /vehicles", client.get("/vehicles")
+
+    def list_deliveries(self, client):
+        return "GET /deliveries", client.get("/deliveries")
+
+    def list_archived_deliveries(self, client):
+        # One month early in the data, so the range reaches into the archive.
+        url = "/deliveries?from=2024-03-01&to=2024-03-31"
+        return "GET /deliveries?from (archived)", client.get(url)
+
+    def list_maintenance(self, client):
+        return "GET /maintenance", client.get("/maintenance")
+
+    def audit_log(self, client):
+        return "GET /audit", client.get("/audit")
+
+    def vehicle_utilization(self, client):
+        return "GET /reports/vehicle_utilization", client.get("/reports/vehicle_utilization")
+
+    def deliveries_per_route(self, client):
+        return "GET /reports/deliveries_per_route", client.get("/reports/deliveries_per_route")
+
+    def archived_route_report(self, client):
+        url = f"/reports/deliveries_per_route?from={DATA_START.isoformat()}"
+        return "GET /reports/deliveries_per_route?from (archived)", client.get(url)
+
+    def integrity_report(self, client):
+        return "GET /integrity", client.get("/integrity")
+
+    def route_path(self, client):
+        origin, destination = self.pick(HUBS), self.pick(HUBS)
+        query = urllib.parse.urlencode({"from": origin, "to": destination})
+        return "GET /routes/path", client.get(f"/routes/path?{query}")
+
+    def open_vehicle_form(self, client):
+        vehicle_id = self.pick(self.vehicle_ids)
+        return "GET /vehicles/<id>/edit", client.get(f"/vehicles/{vehicle_id}/edit")
+
+    def open_delivery_form(self, client):
+        delivery_id = self.pick(self.delivery_ids)
+        return "GET /deliveries/<id>/edit", client.get(f"/deliveries/{delivery_id}/edit")
+
+    def open_maintenance_form(self, client):
+        log_id = self.pick(range(1, self.max_log_id + 1))
+        return "GET /maintenance/<id>/edit", client.get(f"/maintenance/{log_id}/edit")
+
+    def open_new_delivery_form(self, client):
+        return "GET /deliveries/new", client.get("/deliveries/new")
+
+    def open_new_maintenance_form(self, client):
+        return "GET /maintenance/new", client.get("/maintenance/new")
+
+    def random_point(self):
+        with self.lock:
+            return (
+                CENTER_LAT + self.rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+                CENTER_LON + self.rng.uniform(-SPREAD_DEG, SPREAD_DEG) * 1.5,
+            )
+
+    def deliveries_within_box(self, client):
+        lat, lon = self.random_point()
+        query = f"min_lat={lat - 0.02}&max_lat={lat + 0.02}&min_lon={lon - 0.03}&max_lon={lon + 0.03}"
+        return "GET /deliveries/within_box", client.get(f"/deliveries/within_box?{query}")
+
+    def nearest_to_point(self, client):
+        lat, lon = self.random_point()
+        return "GET /deliveries/nearest", client.get(f"/deliveries/nearest?lat={lat}&lon={lon}&n=10")
+
+    def nearest_to_vehicle(self, client):
+        vehicle_id = self.pick(self.vehicle_ids)
+        url = f"/deliveries/nearest?vehicle_id={vehicle_id}&status=pending&radius_km=5&n=50"
+        return "GET /deliveries/nearest?vehicle_id", client.get(url)
+
+    def create_delivery(self, client):
+        return "POST /deliveries/new", client.post("/deliveries/new", data=self.delivery_form())
+
+    def edit_delivery(self, client):
+        delivery_id = self.pick(self.delivery_ids)
+        form = self.delivery_form()
+        form["version"] = self.version("deliveries", "delivery_id", delivery_id)
+        return "POST /deliveries/<id>/edit", client.post(f"/deliveries/{delivery_id}/edit", data=form)
+
+    def edit_vehicle(self, client):
+        vehicle_id = self.pick(self.vehicle_ids)
+        with self.lock:
+            row = self.lookup.execute(
+                "SELECT type, status, license_plate, version FROM vehicles WHERE vehicle_id = ?",
+                (vehicle_id,),
+            ).fetchone()
+        form = {
+            "type": row[0],
+            "capacity": str(self.pick(range(800, 4000, 100))),
+            "status": row[1],
+            "license_plate": row[2],
+            "current_odometer": str(self.pick(range(10000, 250000))),
+            "version": row[3],
+        }
+        return "POST /vehicles/<id>/edit", client.post(f"/vehicles/{vehicle_id}/edit", data=form)
+
+    def create_vehicle(self, client):
+        with self.lock:
+            self.next_vehicle += 1
+            n = self.next_vehicle
+        vehicle_id = f"BENCH-{n:05d}"
+        form = {
+            "vehicle_id": vehicle_id,
+            "type": self.pick(VEHICLE_TYPES),
+            "capacity": str(self.pick(range(800, 4000, 100))),
+            "status": "active",
+            "license_plate": f"BENCH-PLT-{n:05d}",
+            "current_odometer": "0",
+        }
+        response = client.post("/vehicles/new", data=form)
+        with self.lock:
+            self.created_vehicles.append(vehicle_id)
+        return "POST /vehicles/new", response
+
+    def delete_vehicle(self, client):
+        # Only delete vehicles the benchmark itself created. They have no
+        # deliveries, so each delete runs both the live and the archived
+        # delivery checks before removing the row.
+        with self.lock:
+            vehicle_id = self.created_vehicles.pop() if self.created_vehicles else None
+        if vehicle_id is None:
+            return self.create_vehicle(client)
+        return "POST /vehicles/<id>/delete", client.post(f"/vehicles/{vehicle_id}/delete")
+
+    def create_maintenance(self, client):
+        return "POST /maintenance/new", client.post("/maintenance/new", data=self.maintenance_form())
+
+    def edit_maintenance(self, client):
+        log_id = self.pick(range(1, self.max_log_id + 1))
+        form = self.maintenance_form()
+        form["version"] = self.version("maintenance_logs", "log_id", log_id)
+        return "POST /maintenance/<id>/edit", client.post(f"/maintenance/{log_id}/edit", data=form)
+
+    def delete_delivery(self, client):
+        # Only delete deliveries the benchmark itself created, so the
+        # generated data keeps its size across the run.
+        with self.lock:
+            row = self.lookup.execute(
+                "SELECT MAX(delivery_id) FROM deliveries WHERE delivery_id > ?",
+                (self.max_delivery_id,),
+            ).fetchone()
+        if row[0] is None:
+            return self.create_delivery(client)
+        return "POST /deliveries/<id>/delete", client.post(f"/deliveries/{row[0]}/delete")
+
+    def close(self):
+        self.lookup.close()
+
+# ---------- QUERY CAPTURE ----------
+class TracingPool(ConnectionPool):
+    """
+    ConnectionPool that records every statement its connections execute.
+    """
+
+    def __init__(self, base, statements):
+        super().__init__(
+            base.path,
+            size=base.size,
+            busy_timeout=base.busy_timeout,
+            cache_size_kib=base.cache_size_kib,
+            mmap_size=base.mmap_size,
+        )
+        self.statements = statements
+
+    def connect(self):
+        conn = super().connect()
+        conn.set_trace_callback(self.statements.append)
+        return conn
+
+EQUALITY_RE = re.compile(r"(?<![<>!])=")
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+def normalize_sql(sql):
+    return " ".join(LITERAL_RE.sub("?", sql).split())
+
+# Statements that read a whole table on purpose, by normalized SQL prefix.
+# Keep this short: a new entry needs a reason the table stays small or the
+# page genuinely needs every row.
+FULL_SCAN_EXEMPT = {
+    "SELECT * FROM vehicles ORDER BY vehicle_id": "vehicle list page, one row per vehicle",
+    "SELECT vehicle_id, type FROM vehicles WHERE status != ?": "vehicle dropdown on forms",
+    "SELECT route_id, origin, destination FROM routes WHERE is_active = ?": "route dropdown on forms",
+    "SELECT v.vehicle_id, v.type AS vehicle_type": "utilization report, one row per vehicle",
+    "SELECT r.route_id, r.origin, r.destination, COUNT(": "deliveries-per-route report, one row per route",
+    "SELECT m.log_id, m.service_date": "maintenance page lists every log (not paged)",
+    "SELECT d.delivery_id, d.delivery_date, d.status": "delivery list shows every hot delivery in the range (not paged)",
+    "SELECT year, path FROM archive_tiers": "one row per archive year",
+    "SELECT year, path, min_date, max_date, row_count FROM archive_tiers": "one row per archive year",
+    "SELECT table_name, last_rowid, updated_at, completed_at FROM integrity_scan_state": "one row per scanned table",
+    "SELECT check_name, COUNT(*) AS findings FROM integrity_findings": "integrity summary, covering index",
+}
+
+def full_scan_exemption(normalized):
+    for prefix, reason in FULL_SCAN_EXEMPT.items():
+        if normalized.startswith(prefix):
+            return reason
+    return None
+
+def is_full_scan(step, limited=False):
+    """
+    True for a plan step that reads a whole table, including "SCAN <t> USING
+    [COVERING] INDEX", which walks the entire index, and a SEARCH whose only
+    constraints are ranges: nothing stops "(delivery_date>? AND
+    delivery_date<?)" from covering every row. The exception is an index
+    scan or range in a statement whose LIMIT stops it early (`limited`: the
+    statement has a LIMIT and sorts nothing in a temp b-tree). Virtual tables
+    (the R*Tree) report "VIRTUAL TABLE INDEX n:constraints"; an R*Tree scan
+    with no constraints is a full scan too. Scans of a subquery's result are
+    bounded by the subquery's own plan.
+    """
+    if step.startswith("SEARCH ") and "(" in step and not step.startswith("SEARCH ("):
+        # No constraint list at all is the one-seek MIN()/MAX() optimization.
+        constraints = step[step.index("("):]
+        return not limited and not EQUALITY_RE.search(constraints)
+    if not step.startswith("SCAN "):
+        return False
+    if " VIRTUAL TABLE INDEX " in step:
+        return step.endswith("INDEX 2:")
+    if step.startswith("SCAN (") or step == "SCAN CONSTANT ROW":
+        return False
+    return not (limited and " USING " in step)
+
+def check_query_plans(db_path, statements):
+    """
+    Run EXPLAIN QUERY PLAN for each distinct captured statement.
+    Returns (checked, full_scans, exempt, temp_btrees); the last three are
+    lists of {"sql", "plan"} dicts, with a "reason" in the exempt ones.
+    """
+    distinct = {}
+    for sql in statements:
+        head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+        if head not in ("SELECT", "UPDATE", "DELETE", "WITH"):
+            continue
+        if "sqlite_master" in sql:
+            continue
+        distinct.setdefault(normalize_sql(sql), sql)
+
+    conn = sqlite3.connect(db_path)
+    register_sql_functions(conn)
+    # Attach the yearly archives under the names the app uses for them.
+    base = os.path.dirname(os.path.abspath(db_path))
+    for year, path in conn.execute("SELECT year, path FROM archive_tiers").fetchall():
+        conn.execute(f"ATTACH DATABASE ? AS archive_{year}", (os.path.join(base, path),))
+    full_scans, exempt, temp_btrees = [], [], []
+    for normalized, sql in sorted(distinct.items()):
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+        entry = {"sql": normalized, "plan": plan}
+        limited = " LIMIT " in normalized and not any("TEMP B-TREE" in step for step in plan)
+        if any(is_full_scan(step, limited) for step in plan):
+            reason = full_scan_exemption(normalized)
+            if reason is None:
+                full_scans.append(entry)
+            else:
+                exempt.append(dict(entry, reason=reason))
+        if any("TEMP B-TREE" in step for step in plan):
+            temp_btrees.append(entry)
+    conn.close()
+    return len(distinct), full_scans, exempt, temp_btrees
+
+# ---------- RUNNER ----------
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+def summarize(samples, elapsed):
+    endpoints = {}
+    for name in sorted({s[0] for s in samples}):
+        latencies = sorted(s[1] for s in samples if s[0] == name)
+        statuses = [s[2] for s in samples if s[0] == name]
+        expected = EXPECTED_CLIENT_ERRORS.get(name, set())
+        endpoints[name] = {
+            "count": len(latencies),
+            "errors_5xx": sum(1 for status in statuses if status >= 500),
+            "errors_4xx": sum(1 for status in statuses if 400 <= status < 500 and status not in expected),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "throughput_rps": round(len(latencies) / elapsed, 2),
+        }
+    return endpoints
+
+def run_size(size, args, mix, statements):
+    # Each size gets its own directory because archives sit next to the database.
+    size_dir = os.path.join(args.db_dir, f"size_{size}")
+    shutil.rmtree(size_dir, ignore_errors=True)
+    os.makedirs(size_dir)
+    db_path = os.path.join(size_dir, "fleetflow.db")
+    counts = generate_database(db_path, size, seed=args.seed)
+
+    app = create_app({"DATABASE": db_path, "DB_POOL_SIZE": max(args.threads, 1)})
+    app.extensions["fleetflow_pool"] = TracingPool(app.extensions["fleetflow_pool"], statements)
+    workload = Workload(db_path, seed=args.seed)
+
+    categories = list(mix)
+    weights = [mix[c] for c in categories]
+    plan_rng = random.Random(args.seed)
+    ops = []
+    # Every operation runs at least once so every query is plan-checked.
+    for category in categories:
+        ops.extend(workload.categories[category])
+    while len(ops) < args.requests:
+        category = plan_rng.choices(categories, weights)[0]
+        ops.append(plan_rng.choice(workload.categories[category]))
+    plan_rng.shuffle(ops)
+
+    samples = []
+    samples_lock = threading.Lock()
+    local = threading.local()
+
+    def execute(op):
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        started = time.perf_counter()
+        name, response = op(local.client)
+        latency = time.perf_counter() - started
+        with samples_lock:
+            samples.append((name, latency, response.status_code))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(args.threads, 1)) as pool:
+        list(pool.map(execute, ops))
+    elapsed = time.perf_counter() - started
+
+    workload.close()
+    app.extensions["fleetflow_pool"].close_all()
+    return {
+        "size": size,
+        "rows": counts,
+        "requests": len(samples),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        "endpoints": summarize(samples, elapsed),
+    }, db_path
+
+def parse_mix(raw):
+    mix = {}
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown workload category: {name}")
+        mix[name] = float(weight)
+    return mix
+
+def print_run(run, previous=None):
+    print(f"\n== {run['size']} deliveries: {run['requests']} requests in "
+          f"{run['elapsed_s']} s ({run['throughput_rps']} req/s) ==")
+    print(f"{'endpoint':40} {'n':>5} {'5xx':>4} {'4xx':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'req/s':>9}  vs prev p95")
+    for name, stats in run["endpoints"].items():
+        delta = ""
+        if previous and name in previous["endpoints"]:
+            before = previous["endpoints"][name]["p95_ms"]
+            if before:
+                delta = f"{(stats['p95_ms'] - before) / before * 100:+.0f}%"
+        print(f"{name:40} {stats['count']:>5} {stats['errors_5xx']:>4} {stats['errors_4xx']:>4} "
+              f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+              f"{stats['p99_ms']:>9.2f} {stats['throughput_rps']:>9.1f}  {delta}")
+
+def count_errors(run):
+    return sum(stats["errors_5xx"] + stats["errors_4xx"] for stats in run["endpoints"].values())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FleetFlow mixed-workload benchmark")
+    parser.add_argument("--sizes", default="1000,10000",
+                        help="comma-separated delivery counts to generate (default: 1000,10000)")
+    parser.add_argument("--requests", type=int, default=300, help="requests per size")
+    parser.add_argument("--threads", type=int, default=1, help="concurrent clients")
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()),
+                        help="category weights, e.g. list=30,report=15,form=20,write=25,spatial=10")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db-dir", default=None, help="keep generated databases here")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="previous results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    temp_dir = None
+    if args.db_dir is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        args.db_dir = temp_dir.name
+    os.makedirs(args.db_dir, exist_ok=True)
+
+    previous_runs = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous_runs = {run["size"]: run for run in json.load(f)["runs"]}
+
+    statements = []
+    runs = []
+    db_path = None
+    for size in (int(s) for s in args.sizes.split(",")):
+        run, db_path = run_size(size, args, mix, statements)
+        runs.append(run)
+        print_run(run, previous_runs.get(size))
+
+    checked, full_scans, exempt, temp_btrees = check_query_plans(db_path, statements)
+    results = {
+        "generated_at": datetime.datetime.utcnow().isoformat(),
+        "settings": {
+            "sizes": args.sizes,
+            "requests": args.requests,
+            "threads": args.threads,
+            "mix": mix,
+            "seed": args.seed,
+            "sqlite_version": sqlite3.sqlite_version,
+            "python_version": sys.version.split()[0],
+        },
+        "runs": runs,
+        "query_plans": {
+            "checked": checked,
+            "full_scans": full_scans,
+            "exempt_full_scans": exempt,
+            "temp_btrees": temp_btrees,
+        },
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\nQuery plans: {checked} distinct statements checked, "
+          f"{len(temp_btrees)} use a temp b-tree, {len(full_scans)} full table scans "
+          f"({len(exempt)} more exempt by FULL_SCAN_EXEMPT)")
+    for entry in full_scans:
+        print(f"  FULL SCAN: {entry['sql']}")
+        for step in entry["plan"]:
+            print(f"      {step}")
+    errors = sum(count_errors(run) for run in runs)
+    if errors:
+        print(f"ERRORS: {errors} request(s) returned a 5xx or an unexpected 4xx (see the 5xx/4xx columns)")
+    print(f"Results written to {args.output}")
+
+    if temp_dir is not None:
+        temp_dir.cleanup()
+    return 1 if full_scans or errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
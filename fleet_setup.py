@@ -1,11 +1,6 @@
 import sqlite3
 
 DB_PATH = "fleetflow.db"
-conn = sqlite3.connect(DB_PATH)
-cur = conn.cursor()
-
-# Enable foreign key enforcement for SQLite (ensure referential integrity)
-cur.execute("PRAGMA foreign_keys = ON;")
 
 DDL = """
 -- Schema definition for FleetFlow operations database
@@ -17,7 +12,8 @@ CREATE TABLE IF NOT EXISTS vehicles (
     status TEXT NOT NULL CHECK (status IN ('active', 'maintenance', 'retired')),  -- To limit scope I am only enforcing these three statuses
     -- Additional vehicle attributes I added for better tracking
     license_plate TEXT UNIQUE NOT NULL, -- This is a real-world identifier
-    current_odometer INTEGER -- in kilometers
+    current_odometer INTEGER, -- in kilometers
+    version INTEGER NOT NULL DEFAULT 1 -- bumped on every edit (optimistic concurrency)
 );
 
 CREATE TABLE IF NOT EXISTS routes (
@@ -42,6 +38,9 @@ CREATE TABLE IF NOT EXISTS deliveries (
     customer_address TEXT,
     -- Added Checks for data integrity
     status TEXT NOT NULL CHECK (status IN ('pending', 'in_transit', 'completed', 'cancelled')),
+    version INTEGER NOT NULL DEFAULT 1, -- bumped on every edit (optimistic concurrency)
+    latitude REAL,  -- from the offline gazetteer (geocode.py)
+    longitude REAL,
     FOREIGN KEY(vehicle_id) REFERENCES vehicles(vehicle_id),
     FOREIGN KEY(route_id) REFERENCES routes(route_id)
 );
@@ -56,6 +55,7 @@ CREATE TABLE IF NOT EXISTS maintenance_logs (
     odometer_at_service INTEGER,
     vendor TEXT,
     cost NUMERIC CHECK(cost >= 0),
+    version INTEGER NOT NULL DEFAULT 1, -- bumped on every edit (optimistic concurrency)
     FOREIGN KEY(vehicle_id) REFERENCES vehicles(vehicle_id)
 );
 
@@ -78,7 +78,154 @@ CREATE INDEX IF NOT EXISTS idx_deliveries_date ON deliveries(delivery_date);
 CREATE INDEX IF NOT EXISTS idx_maint_vehicle_id ON maintenance_logs(vehicle_id); 
 CREATE INDEX IF NOT EXISTS idx_maint_service_date ON maintenance_logs(service_date);
 
+-- The audit page shows the newest entries first; without this it sorts the whole table.
+CREATE INDEX IF NOT EXISTS idx_audit_timestamp ON audit_log(timestamp);
+
+-- Written by integrity_scan.py: one row per record that fails a data check,
+-- and how far the scanner has got through each table (so it can resume).
+CREATE TABLE IF NOT EXISTS integrity_findings (
+    finding_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    check_name TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    record_rowid INTEGER NOT NULL, -- rowid of the offending row, used to rescan by range
+    record_id TEXT NOT NULL,       -- its primary key as shown in the app
+    details TEXT,
+    found_at TEXT NOT NULL         -- ISO datetime string
+);
+
+CREATE TABLE IF NOT EXISTS integrity_scan_state (
+    table_name TEXT PRIMARY KEY,
+    last_rowid INTEGER NOT NULL DEFAULT 0, -- checkpoint: rows up to here are checked in this pass
+    updated_at TEXT,
+    completed_at TEXT                      -- end of the last full pass
+);
+
+CREATE INDEX IF NOT EXISTS idx_findings_table_rowid ON integrity_findings(table_name, record_rowid);
+CREATE INDEX IF NOT EXISTS idx_findings_check ON integrity_findings(check_name);
+CREATE INDEX IF NOT EXISTS idx_findings_found_at ON integrity_findings(found_at);
+
+-- Written by archive.py: one row per yearly archive file of closed deliveries.
+-- The app uses the date span to decide which archives a query needs to ATTACH.
+CREATE TABLE IF NOT EXISTS archive_tiers (
+    year TEXT PRIMARY KEY,   -- YYYY
+    path TEXT NOT NULL,      -- relative to the directory of this database
+    min_date TEXT NOT NULL,  -- earliest delivery_date archived
+    max_date TEXT NOT NULL,  -- latest delivery_date archived
+    row_count INTEGER NOT NULL DEFAULT 0,
+    archived_at TEXT         -- ISO datetime string of the last archive run
+);
+
+-- Written by migrate.py: one row per schema migration. A migration that was
+-- interrupted stays 'in_progress' with the step and rowid it had reached.
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('in_progress', 'applied')),
+    step INTEGER NOT NULL DEFAULT 0,       -- steps completed so far
+    last_rowid INTEGER NOT NULL DEFAULT 0, -- backfill checkpoint within the current step
+    started_at TEXT,                       -- ISO datetime string
+    applied_at TEXT
+);
+
+-- Change log for routes, filled by the triggers below. Each app process keeps
+-- an in-memory route graph (route_graph.py) and applies the entries it has not
+-- seen yet instead of rebuilding the whole graph.
+CREATE TABLE IF NOT EXISTS route_changes (
+    change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    route_id TEXT NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_route_change_insert
+AFTER INSERT ON routes
+BEGIN
+    INSERT INTO route_changes (route_id) VALUES (NEW.route_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_route_change_update
+AFTER UPDATE OF route_id, origin, destination, distance_km, is_active ON routes
+BEGIN
+    INSERT INTO route_changes (route_id) VALUES (OLD.route_id);
+    INSERT INTO route_changes (route_id) SELECT NEW.route_id WHERE NEW.route_id <> OLD.route_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_route_change_delete
+AFTER DELETE ON routes
+BEGIN
+    INSERT INTO route_changes (route_id) VALUES (OLD.route_id);
+END;
+
+"""
+
+# Columns added after the first release. Databases created before them get
+# the columns added in place by init_db().
+ADDED_COLUMNS = [
+    ("vehicles", "version", "INTEGER NOT NULL DEFAULT 1"),
+    ("deliveries", "version", "INTEGER NOT NULL DEFAULT 1"),
+    ("maintenance_logs", "version", "INTEGER NOT NULL DEFAULT 1"),
+    ("deliveries", "latitude", "REAL"),
+    ("deliveries", "longitude", "REAL"),
+]
+
+SPATIAL_DDL = """
+-- R*Tree over delivery coordinates for bounding-box and nearest-N lookups.
+-- Each delivery is stored as a point (min = max). The triggers keep it in step
+-- with deliveries.latitude/longitude, so application code never writes to it.
+CREATE VIRTUAL TABLE IF NOT EXISTS delivery_locations USING rtree(
+    delivery_id,
+    min_lat, max_lat,
+    min_lon, max_lon
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_delivery_location_insert
+AFTER INSERT ON deliveries
+WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+BEGIN
+    INSERT INTO delivery_locations VALUES (
+        NEW.delivery_id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_delivery_location_update
+AFTER UPDATE OF latitude, longitude ON deliveries
+BEGIN
+    DELETE FROM delivery_locations WHERE delivery_id = OLD.delivery_id;
+    INSERT INTO delivery_locations
+    SELECT NEW.delivery_id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+    WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_delivery_location_delete
+AFTER DELETE ON deliveries
+BEGIN
+    DELETE FROM delivery_locations WHERE delivery_id = OLD.delivery_id;
+END;
 """
-cur.executescript(DDL)
-conn.commit()
-conn.close()
\ No newline at end of file
+
+def init_db(db_path=DB_PATH):
+    """
+    Create (or upgrade) the FleetFlow schema in the database at db_path.
+    """
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+
+    # Enable foreign key enforcement for SQLite (ensure referential integrity)
+    cur.execute("PRAGMA foreign_keys = ON;")
+
+    # WAL lets readers keep working while an editor holds the write lock.
+    # The setting is stored in the database file, so it only needs to be set once.
+    cur.execute("PRAGMA journal_mode = WAL;")
+
+    cur.executescript(DDL)
+
+    for table, column, declaration in ADDED_COLUMNS:
+        columns = [row[1] for row in cur.execute(f"PRAGMA table_info({table});")]
+        if column not in columns:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration};")
+
+    cur.executescript(SPATIAL_DDL)
+
+    conn.commit()
+    conn.close()
+
+if __name__ == "__main__":
+    init_db()
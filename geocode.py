@@ -0,0 +1,206 @@
+"""
+Offline geocoding for delivery addresses.
+
+Coordinates come from a local gazetteer file (geocode_cache.csv) that maps
+addresses, and locality names as a fallback, to latitude/longitude. Nothing
+is looked up over the network. Operators grow the file as new addresses
+appear, then run the backfill to fill in deliveries that are missing
+coordinates:
+
+    python geocode.py add "12 Elm St, Downtown" 49.6950 -112.8400
+    python geocode.py backfill
+"""
+
+import argparse
+import csv
+import math
+import os
+import re
+import sqlite3
+import time
+
+GEOCODE_CACHE_PATH = "geocode_cache.csv"
+DB_PATH = "fleetflow.db"
+
+EARTH_RADIUS_KM = 6371.0088
+
+def normalize_address(address):
+    """
+    Canonical form used as the gazetteer key: lower case, no periods,
+    single spaces, and no spaces around commas.
+    """
+    text = address.lower().replace(".", "")
+    text = re.sub(r"\s*,\s*", ",", text)
+    return re.sub(r"\s+", " ", text).strip(" ,")
+
+def file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+class Gazetteer:
+    """
+    In-memory address -> (latitude, longitude) map backed by a CSV file.
+    """
+
+    def __init__(self, entries=None, path=None, mtime=None):
+        self.entries = dict(entries or {})
+        self.path = path    # file this was loaded from, if any
+        self.mtime = mtime  # its modification time when loaded
+
+    @classmethod
+    def load(cls, path=GEOCODE_CACHE_PATH):
+        """
+        Read the gazetteer at path. A missing file gives an empty gazetteer.
+        """
+        entries = {}
+        mtime = file_mtime(path)
+        if mtime is not None:
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    entries[normalize_address(row["address"])] = (
+                        float(row["latitude"]),
+                        float(row["longitude"]),
+                    )
+        return cls(entries, path, mtime)
+
+    def refresh(self):
+        """
+        Re-read the file if it has changed since it was loaded, so entries
+        added with `geocode.py add` reach a running app without a restart.
+        """
+        if self.path is None or file_mtime(self.path) == self.mtime:
+            return
+        fresh = Gazetteer.load(self.path)
+        self.entries, self.mtime = fresh.entries, fresh.mtime
+
+    def add(self, address, latitude, longitude):
+        self.entries[normalize_address(address)] = (float(latitude), float(longitude))
+
+    def save(self, path=GEOCODE_CACHE_PATH):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["address", "latitude", "longitude"])
+            for key in sorted(self.entries):
+                writer.writerow([key, *self.entries[key]])
+
+    def lookup(self, address):
+        """
+        Return (latitude, longitude) for an address, or (None, None).
+
+        An exact match wins; otherwise the locality after the last comma
+        (e.g. "Downtown") is used as an approximate position.
+        """
+        if not address:
+            return None, None
+        key = normalize_address(address)
+        if key in self.entries:
+            return self.entries[key]
+        locality = key.rsplit(",", 1)[-1]
+        return self.entries.get(locality, (None, None))
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance between two points in kilometres.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    (min_lat, max_lat, min_lon, max_lon) enclosing a circle of radius_km.
+    The longitude span is the exact one for a sphere, so every point within
+    radius_km is inside. Boxes are clamped at the poles and the antimeridian
+    rather than wrapped.
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    d_lat = math.degrees(angular)
+    cos_lat = math.cos(math.radians(latitude))
+    if math.sin(angular) >= cos_lat or latitude + d_lat >= 90.0 or latitude - d_lat <= -90.0:
+        d_lon = 180.0
+    else:
+        d_lon = math.degrees(math.asin(math.sin(angular) / cos_lat))
+    return (
+        max(-90.0, latitude - d_lat),
+        min(90.0, latitude + d_lat),
+        max(-180.0, longitude - d_lon),
+        min(180.0, longitude + d_lon),
+    )
+
+def backfill_deliveries(db_path, gazetteer, chunk_size=1000, pause_seconds=0.0):
+    """
+    Fill latitude/longitude for deliveries that have none, walking the table
+    in delivery_id chunks with one short transaction per chunk. The spatial
+    index is kept in step by the triggers in fleet_setup.py.
+    Returns the number of deliveries geocoded.
+    """
+    conn = sqlite3.connect(db_path, timeout=5.0)
+    last_id = 0
+    updated = 0
+    while True:
+        rows = conn.execute(
+            """
+            SELECT delivery_id, customer_address
+            FROM deliveries
+            WHERE delivery_id > ?
+            ORDER BY delivery_id
+            LIMIT ?
+            """,
+            (last_id, chunk_size),
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        changes = []
+        for delivery_id, address in rows:
+            latitude, longitude = gazetteer.lookup(address)
+            if latitude is not None:
+                changes.append((latitude, longitude, delivery_id))
+        cursor = conn.executemany(
+            """
+            UPDATE deliveries
+            SET latitude = ?, longitude = ?
+            WHERE delivery_id = ? AND latitude IS NULL
+            """,
+            changes,
+        )
+        updated += max(cursor.rowcount, 0)
+        conn.commit()
+        if pause_seconds:
+            time.sleep(pause_seconds)
+    conn.close()
+    return updated
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FleetFlow offline geocoding")
+    parser.add_argument("--gazetteer", default=GEOCODE_CACHE_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="add or correct a gazetteer entry")
+    add.add_argument("address")
+    add.add_argument("latitude", type=float)
+    add.add_argument("longitude", type=float)
+
+    backfill = commands.add_parser("backfill", help="geocode deliveries missing coordinates")
+    backfill.add_argument("--db", default=DB_PATH)
+    backfill.add_argument("--chunk-size", type=int, default=1000)
+    backfill.add_argument("--pause", type=float, default=0.0,
+                          help="seconds to sleep between chunks")
+
+    args = parser.parse_args(argv)
+    gazetteer = Gazetteer.load(args.gazetteer)
+    if args.command == "add":
+        gazetteer.add(args.address, args.latitude, args.longitude)
+        gazetteer.save(args.gazetteer)
+        print(f"Saved {args.address} to {args.gazetteer}")
+    else:
+        count = backfill_deliveries(args.db, gazetteer, args.chunk_size, args.pause)
+        print(f"Geocoded {count} deliveries.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Incremental data-integrity scanner for FleetFlow.
+
+Each table is walked in rowid chunks. Every chunk is checked and its findings
+are replaced in one short transaction, and the position reached is saved in
+integrity_scan_state. An interrupted scan therefore resumes where it stopped,
+and the scan can run against the live database next to the web app:
+
+    python integrity_scan.py                      # one full pass, resuming if needed
+    python integrity_scan.py --max-chunks 20      # do a bounded slice (e.g. from cron)
+    python integrity_scan.py --pause 0.1          # sleep between chunks
+    python integrity_scan.py --reset              # forget checkpoints and start over
+
+Findings are stored in integrity_findings and shown at /integrity.
+"""
+
+import argparse
+import datetime
+import sqlite3
+import time
+
+from rowid_chunks import next_chunk_end
+
+DB_PATH = "fleetflow.db"
+
+# (check_name, table, description, sql). Each query receives the rowid range
+# (low, high] of the chunk being scanned and returns (rowid, record_id, details)
+# for every row in that range that fails the check.
+CHECKS = [
+    (
+        "odometer_above_vehicle",
+        "maintenance_logs",
+        "Service odometer is higher than the vehicle's current odometer",
+        """
+        SELECT m.rowid, m.log_id,
+               'odometer_at_service ' || m.odometer_at_service
+               || ' > vehicle ' || v.vehicle_id || ' current_odometer ' || v.current_odometer
+        FROM maintenance_logs m
+        JOIN vehicles v ON v.vehicle_id = m.vehicle_id
+        WHERE m.rowid > ? AND m.rowid <= ?
+          AND m.odometer_at_service > v.current_odometer
+        """,
+    ),
+    (
+        "odometer_decreasing",
+        "maintenance_logs",
+        "Service odometer is lower than an earlier service on the same vehicle",
+        """
+        SELECT m.rowid, m.log_id,
+               'odometer_at_service ' || m.odometer_at_service || ' on ' || m.service_date
+               || ' < ' || MAX(p.odometer_at_service) || ' recorded earlier'
+        FROM maintenance_logs m
+        JOIN maintenance_logs p
+          ON p.vehicle_id = m.vehicle_id AND p.service_date < m.service_date
+        WHERE m.rowid > ? AND m.rowid <= ?
+        GROUP BY m.rowid
+        HAVING m.odometer_at_service < MAX(p.odometer_at_service)
+        """,
+    ),
+    (
+        "delivered_before_scheduled",
+        "deliveries",
+        "delivery_time is earlier than scheduled_time",
+        """
+        SELECT rowid, delivery_id,
+               'delivery_time ' || delivery_time || ' < scheduled_time ' || scheduled_time
+        FROM deliveries
+        WHERE rowid > ? AND rowid <= ?
+          AND delivery_time IS NOT NULL AND scheduled_time IS NOT NULL
+          AND delivery_time < scheduled_time
+        """,
+    ),
+    (
+        "completed_without_time",
+        "deliveries",
+        "Completed delivery has no delivery_time",
+        """
+        SELECT rowid, delivery_id, 'status completed but delivery_time is empty'
+        FROM deliveries
+        WHERE rowid > ? AND rowid <= ?
+          AND status = 'completed' AND delivery_time IS NULL
+        """,
+    ),
+    (
+        "open_on_retired_vehicle",
+        "deliveries",
+        "Pending or in-transit delivery assigned to a retired vehicle",
+        """
+        SELECT d.rowid, d.delivery_id, 'vehicle ' || v.vehicle_id || ' is retired'
+        FROM deliveries d
+        JOIN vehicles v ON v.vehicle_id = d.vehicle_id
+        WHERE d.rowid > ? AND d.rowid <= ?
+          AND d.status IN ('pending', 'in_transit') AND v.status = 'retired'
+        """,
+    ),
+    (
+        "open_on_inactive_route",
+        "deliveries",
+        "Pending or in-transit delivery on an inactive route",
+        """
+        SELECT d.rowid, d.delivery_id, 'route ' || r.route_id || ' is inactive'
+        FROM deliveries d
+        JOIN routes r ON r.route_id = d.route_id
+        WHERE d.rowid > ? AND d.rowid <= ?
+          AND d.status IN ('pending', 'in_transit') AND r.is_active = 0
+        """,
+    ),
+    (
+        "orphan_delivery_vehicle",
+        "deliveries",
+        "Delivery references a vehicle that does not exist",
+        """
+        SELECT d.rowid, d.delivery_id, 'vehicle_id ' || d.vehicle_id || ' not found'
+        FROM deliveries d
+        LEFT JOIN vehicles v ON v.vehicle_id = d.vehicle_id
+        WHERE d.rowid > ? AND d.rowid <= ? AND v.vehicle_id IS NULL
+        """,
+    ),
+    (
+        "orphan_delivery_route",
+        "deliveries",
+        "Delivery references a route that does not exist",
+        """
+        SELECT d.rowid, d.delivery_id, 'route_id ' || d.route_id || ' not found'
+        FROM deliveries d
+        LEFT JOIN routes r ON r.route_id = d.route_id
+        WHERE d.rowid > ? AND d.rowid <= ? AND r.route_id IS NULL
+        """,
+    ),
+    (
+        "orphan_maintenance_vehicle",
+        "maintenance_logs",
+        "Maintenance log references a vehicle that does not exist",
+        """
+        SELECT m.rowid, m.log_id, 'vehicle_id ' || m.vehicle_id || ' not found'
+        FROM maintenance_logs m
+        LEFT JOIN vehicles v ON v.vehicle_id = m.vehicle_id
+        WHERE m.rowid > ? AND m.rowid <= ? AND v.vehicle_id IS NULL
+        """,
+    ),
+]
+
+CHECK_DESCRIPTIONS = {name: description for name, _, description, _ in CHECKS}
+
+def scanned_tables():
+    tables = []
+    for _, table, _, _ in CHECKS:
+        if table not in tables:
+            tables.append(table)
+    return tables
+
+def now():
+    return datetime.datetime.utcnow().isoformat()
+
+def load_checkpoint(conn, table):
+    row = conn.execute(
+        "SELECT last_rowid FROM integrity_scan_state WHERE table_name = ?",
+        (table,),
+    ).fetchone()
+    return row[0] if row else 0
+
+def scan_chunk(conn, table, low, high):
+    """
+    Re-check rows in (low, high] and replace their findings. One transaction:
+    stale findings for rows that have since been fixed disappear, and the
+    checkpoint moves forward together with the new findings.
+    Returns the number of findings recorded.
+    """
+    found = []
+    for name, check_table, _, sql in CHECKS:
+        if check_table != table:
+            continue
+        for rowid, record_id, details in conn.execute(sql, (low, high)):
+            found.append((name, table, rowid, str(record_id), details))
+
+    timestamp = now()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            """
+            DELETE FROM integrity_findings
+            WHERE table_name = ? AND record_rowid > ? AND record_rowid <= ?
+            """,
+            (table, low, high),
+        )
+        conn.executemany(
+            """
+            INSERT INTO integrity_findings (
+                check_name, table_name, record_rowid, record_id, details, found_at
+            ) VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [row + (timestamp,) for row in found],
+        )
+        conn.execute(
+            """
+            INSERT INTO integrity_scan_state (table_name, last_rowid, updated_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(table_name) DO UPDATE
+            SET last_rowid = excluded.last_rowid, updated_at = excluded.updated_at
+            """,
+            (table, high, timestamp),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(found)
+
+def finish_pass(conn, table, last_rowid):
+    """
+    Record a completed pass over a table. Findings for rows past the end
+    (deleted since the last pass) are dropped, and the checkpoint goes back
+    to the start for the next pass.
+    """
+    timestamp = now()
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute(
+        "DELETE FROM integrity_findings WHERE table_name = ? AND record_rowid > ?",
+        (table, last_rowid),
+    )
+    conn.execute(
+        """
+        INSERT INTO integrity_scan_state (table_name, last_rowid, updated_at, completed_at)
+        VALUES (?, 0, ?, ?)
+        ON CONFLICT(table_name) DO UPDATE
+        SET last_rowid = 0, updated_at = excluded.updated_at, completed_at = excluded.completed_at
+        """,
+        (table, timestamp, timestamp),
+    )
+    conn.commit()
+
+def run_scan(db_path=DB_PATH, chunk_size=500, pause_seconds=0.0, max_chunks=None, reset=False):
+    """
+    Scan every table from its checkpoint. Stops after max_chunks chunks if
+    given, otherwise after one full pass. Returns {table: findings recorded}.
+    """
+    conn = sqlite3.connect(db_path, timeout=5.0, isolation_level=None)
+    if reset:
+        conn.execute("DELETE FROM integrity_scan_state")
+
+    recorded = {}
+    chunks = 0
+    for table in scanned_tables():
+        recorded[table] = 0
+        last_rowid = load_checkpoint(conn, table)
+        while True:
+            if max_chunks is not None and chunks >= max_chunks:
+                conn.close()
+                return recorded
+            high = next_chunk_end(conn, table, last_rowid, chunk_size)
+            if high is None:
+                finish_pass(conn, table, last_rowid)
+                break
+            recorded[table] += scan_chunk(conn, table, last_rowid, high)
+            last_rowid = high
+            chunks += 1
+            if pause_seconds:
+                time.sleep(pause_seconds)
+    conn.close()
+    return recorded
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FleetFlow data-integrity scanner")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--chunk-size", type=int, default=500, help="rows per chunk")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between chunks")
+    parser.add_argument("--max-chunks", type=int, default=None,
+                        help="stop after this many chunks (resume on the next run)")
+    parser.add_argument("--reset", action="store_true", help="restart every table from the beginning")
+    args = parser.parse_args(argv)
+
+    recorded = run_scan(args.db, args.chunk_size, args.pause, args.max_chunks, args.reset)
+    for table, count in recorded.items():
+        print(f"{table}: {count} findings recorded")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@
 
 import sqlite3
 
+from geocode import Gazetteer
+
 DB_PATH = "fleetflow.db"
 
 def main():
@@ -76,14 +78,18 @@ def main():
          "Client J", "300 Tech Blvd, Industrial Park", "cancelled"),
     ]
 
+    # Geocode each address from the offline gazetteer
+    gazetteer = Gazetteer.load()
+    deliveries = [row + gazetteer.lookup(row[6]) for row in deliveries]
+
     cur.executemany(
         """
         INSERT INTO deliveries (
             vehicle_id, route_id, delivery_date,
             scheduled_time, delivery_time,
             customer_name, customer_address,
-            status
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+            status, latitude, longitude
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
         """,
         deliveries,
     )
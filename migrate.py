@@ -0,0 +1,355 @@
+"""
+Versioned schema migrations for FleetFlow.
+
+fleet_setup.py creates the base schema. Changes made after that are listed in
+MIGRATIONS and applied in version order; schema_version records which ones
+have been applied and how far an unfinished one has got.
+
+    python migrate.py --dry-run                 # pending migrations and their estimated cost
+    python migrate.py                           # apply them
+    python migrate.py --chunk-size 2000 --pause 0.05
+
+Backfills walk their table in rowid chunks with one short write transaction
+per chunk, and the checkpoint is saved in the same transaction. The app keeps
+writing between chunks, and an interrupted run resumes from the last chunk.
+Every other step runs in its own transaction together with the step counter.
+"""
+
+import argparse
+import datetime
+import math
+import sqlite3
+import time
+
+from fleet_setup import DB_PATH, init_db
+from rowid_chunks import next_chunk_end
+
+# (version, name, steps). Versions only ever grow; never edit a migration once
+# it has been applied somewhere, add a new one instead. Step kinds:
+#   ("sql", statement)                        quick DDL, e.g. CREATE TABLE
+#   ("add_column", table, column, declaration) skipped if the column exists
+#   ("create_index", name, table, columns)    one transaction; writers wait for it
+#   ("backfill", table, sql)                  sql gets the rowid range (low, high]
+#                                             of each chunk, like integrity_scan.CHECKS
+MIGRATIONS = [
+    (
+        1,
+        "deliveries_vehicle_and_route_date_indexes",
+        [
+            # Serve "this vehicle's/route's deliveries in a date range" and the
+            # latest-delivery lookup in vehicle_position() without a sort.
+            ("create_index", "idx_deliveries_vehicle_date", "deliveries", "vehicle_id, delivery_date"),
+            ("create_index", "idx_deliveries_route_date", "deliveries", "route_id, delivery_date"),
+        ],
+    ),
+    (
+        2,
+        "maintenance_vehicle_date_odometer_index",
+        [
+            # integrity_scan's odometer_decreasing check reads each vehicle's
+            # earlier services; this makes that a covering range seek.
+            (
+                "create_index", "idx_maint_vehicle_date_odometer", "maintenance_logs",
+                "vehicle_id, service_date, odometer_at_service",
+            ),
+        ],
+    ),
+]
+
+def now():
+    return datetime.datetime.utcnow().isoformat()
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=5.0, isolation_level=None)
+    conn.execute("PRAGMA foreign_keys = ON;")
+    return conn
+
+def describe(step):
+    kind = step[0]
+    if kind == "sql":
+        return " ".join(step[1].split())[:60]
+    if kind == "add_column":
+        return f"add column {step[1]}.{step[2]}"
+    if kind == "create_index":
+        return f"create index {step[1]} on {step[2]}({step[3]})"
+    return f"backfill {step[1]}"
+
+def load_versions(conn):
+    """
+    {version: (status, step, last_rowid)} from schema_version, or {} if the
+    table does not exist yet.
+    """
+    try:
+        rows = conn.execute(
+            "SELECT version, status, step, last_rowid FROM schema_version ORDER BY version"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {version: (status, step, last_rowid) for version, status, step, last_rowid in rows}
+
+def current_version(versions):
+    applied = [v for v, (status, _, _) in versions.items() if status == "applied"]
+    return max(applied, default=0)
+
+def pending_migrations(versions, target=None):
+    return [
+        migration for migration in MIGRATIONS
+        if versions.get(migration[0], ("pending",))[0] != "applied"
+        and (target is None or migration[0] <= target)
+    ]
+
+def apply_step(conn, step):
+    """
+    Run one non-backfill step inside the caller's transaction.
+    """
+    kind = step[0]
+    if kind == "sql":
+        conn.execute(step[1])
+    elif kind == "add_column":
+        _, table, column, declaration = step
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table});")]
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration};")
+    elif kind == "create_index":
+        _, name, table, columns = step
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})")
+    else:
+        raise ValueError(f"Unknown migration step kind: {kind}")
+
+def save_progress(conn, version, step, last_rowid=0):
+    conn.execute(
+        "UPDATE schema_version SET step = ?, last_rowid = ? WHERE version = ?",
+        (step, last_rowid, version),
+    )
+
+def run_backfill(conn, version, index, step, chunk_size, pause_seconds, progress):
+    """
+    Apply a backfill step chunk by chunk from its saved checkpoint.
+    Returns the number of rows changed.
+    """
+    _, table, sql = step
+    first, last = conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table}").fetchone()
+    changed = 0
+    started = time.perf_counter()
+    reported = 0.0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Read the checkpoint under the write lock so two runners cannot
+            # process the same chunk.
+            low = conn.execute(
+                "SELECT last_rowid FROM schema_version WHERE version = ?", (version,)
+            ).fetchone()[0]
+            high = next_chunk_end(conn, table, low, chunk_size)
+            if high is None:
+                save_progress(conn, version, index + 1)
+                conn.commit()
+                break
+            changed += max(conn.execute(sql, (low, high)).rowcount, 0)
+            save_progress(conn, version, index, high)
+            conn.commit()
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+        elapsed = time.perf_counter() - started
+        if progress and (elapsed - reported >= 1.0):
+            reported = elapsed
+            done = 1.0 if last is None or last <= first else min(1.0, (high - first) / (last - first))
+            eta = elapsed / done - elapsed if done else 0.0
+            progress(f"  {describe(step)}: {done:6.1%} through rowid {high}, "
+                     f"{changed} rows changed, ~{eta:.0f} s left")
+        if pause_seconds:
+            time.sleep(pause_seconds)
+    return changed
+
+def apply_migration(conn, migration, chunk_size, pause_seconds, progress=None):
+    version, name, steps = migration
+    state = load_versions(conn).get(version)
+    if state is None:
+        conn.execute(
+            """
+            INSERT INTO schema_version (version, name, status, step, last_rowid, started_at)
+            VALUES (?, ?, 'in_progress', 0, 0, ?)
+            """,
+            (version, name, now()),
+        )
+        first_step = 0
+    else:
+        first_step = state[1]
+        if progress:
+            progress(f"Resuming migration {version} ({name}) at step {first_step + 1}")
+
+    for index in range(first_step, len(steps)):
+        step = steps[index]
+        started = time.perf_counter()
+        if progress:
+            progress(f"[{version}] step {index + 1}/{len(steps)}: {describe(step)}")
+        if step[0] == "backfill":
+            run_backfill(conn, version, index, step, chunk_size, pause_seconds, progress)
+        else:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                apply_step(conn, step)
+                save_progress(conn, version, index + 1)
+                conn.commit()
+            except Exception:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+        if progress:
+            progress(f"  done in {time.perf_counter() - started:.2f} s")
+
+    conn.execute(
+        "UPDATE schema_version SET status = 'applied', applied_at = ? WHERE version = ?",
+        (now(), version),
+    )
+
+def run_migrations(db_path=DB_PATH, chunk_size=1000, pause_seconds=0.0, target=None, progress=None):
+    """
+    Bring the database up to `target` (default: the latest migration).
+    Returns the versions applied by this run.
+    """
+    init_db(db_path)
+    conn = connect(db_path)
+    applied = []
+    try:
+        for migration in pending_migrations(load_versions(conn), target):
+            apply_migration(conn, migration, chunk_size, pause_seconds, progress)
+            applied.append(migration[0])
+    finally:
+        # Closing also rolls back a chunk that was cut short (e.g. by Ctrl+C).
+        conn.close()
+    return applied
+
+# ---------- DRY RUN ----------
+def sample_in_write_transaction(conn, steps):
+    """
+    Run steps inside BEGIN IMMEDIATE, time the last one and roll everything
+    back. The earlier steps are the quick DDL the sampled step depends on.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for step in steps[:-1]:
+            apply_step(conn, step)
+        started = time.perf_counter()
+        if steps[-1][0] == "backfill":
+            _, _, sql, low, high = steps[-1]
+            conn.execute(sql, (low, high))
+        else:
+            apply_step(conn, steps[-1])
+        return time.perf_counter() - started
+    finally:
+        conn.rollback()
+
+def estimate_step(conn, step, earlier, last_rowid, chunk_size, pause_seconds):
+    """
+    (rows, transactions, seconds, longest_lock_seconds) for one step. `earlier`
+    are the migration's preceding steps that have not been applied yet.
+
+    Counting and the index sample only read the database (the sample index is
+    built on a temporary copy), so writers are never blocked by them. Quick DDL
+    and the first backfill chunk are timed in their own write transaction,
+    which is rolled back and lasts about as long as the real step or chunk.
+    """
+    quick_ddl = [s for s in earlier if s[0] in ("sql", "add_column")]
+    kind = step[0]
+    if kind in ("sql", "add_column"):
+        seconds = sample_in_write_transaction(conn, quick_ddl + [step])
+        return None, 1, seconds, seconds
+
+    table = step[2] if kind == "create_index" else step[1]
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    if not exists:
+        # Created by an earlier step of this migration, so still empty.
+        return 0, 1, 0.0, 0.0
+    rows = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE rowid > ?", (last_rowid,)).fetchone()[0]
+    if not rows:
+        return 0, 1, 0.0, 0.0
+
+    if kind == "create_index":
+        # Time the same index on a sample copied into a temporary table and
+        # scale up by n log n, the cost of the sort behind CREATE INDEX.
+        _, name, _, columns = step
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)
+        ).fetchone()
+        if exists:
+            return 0, 1, 0.0, 0.0
+        conn.execute(f"CREATE TEMP TABLE migrate_sample AS SELECT * FROM main.{table} LIMIT ?", (chunk_size,))
+        try:
+            # Columns this migration adds before the index do not exist yet.
+            present = {row[1] for row in conn.execute("PRAGMA temp.table_info(migrate_sample)")}
+            for _, added_table, column, declaration in (s for s in quick_ddl if s[0] == "add_column"):
+                if added_table == table and column not in present:
+                    conn.execute(f"ALTER TABLE temp.migrate_sample ADD COLUMN {column} {declaration}")
+            sample = max(conn.execute("SELECT COUNT(*) FROM temp.migrate_sample").fetchone()[0], 2)
+            started = time.perf_counter()
+            conn.execute(f"CREATE INDEX temp.migrate_sample_index ON migrate_sample({columns})")
+            seconds = (time.perf_counter() - started) * (rows * math.log(rows)) / (sample * math.log(sample))
+        finally:
+            conn.execute("DROP TABLE temp.migrate_sample")
+        return rows, 1, seconds, seconds
+
+    # Backfill: time the first chunk, then scale by the number of chunks.
+    _, _, sql = step
+    high = next_chunk_end(conn, table, last_rowid, chunk_size)
+    per_chunk = sample_in_write_transaction(conn, quick_ddl + [("backfill", table, sql, last_rowid, high)])
+    chunks = math.ceil(rows / chunk_size)
+    return rows, chunks, chunks * per_chunk + (chunks - 1) * pause_seconds, per_chunk
+
+def dry_run(db_path=DB_PATH, chunk_size=1000, pause_seconds=0.0, target=None):
+    """
+    Print what run_migrations() would do and how long it is expected to take.
+    Nothing is changed: rows are counted and indexes sampled without the write
+    lock, and the short samples that do need it are rolled back.
+    """
+    conn = connect(db_path)
+    versions = load_versions(conn)
+    pending = pending_migrations(versions, target)
+    print(f"{db_path}: schema version {current_version(versions)}, {len(pending)} pending migration(s)")
+
+    total = 0.0
+    try:
+        for version, name, steps in pending:
+            state = versions.get(version)
+            first_step, last_rowid = (state[1], state[2]) if state else (0, 0)
+            print(f"  {version} {name}" + (f" (resuming at step {first_step + 1})" if state else ""))
+            for index in range(first_step, len(steps)):
+                step = steps[index]
+                rows, transactions, seconds, lock = estimate_step(
+                    conn, step, steps[first_step:index],
+                    last_rowid if index == first_step else 0, chunk_size, pause_seconds,
+                )
+                total += seconds
+                size = "" if rows is None else f"{rows} rows, "
+                print(f"      {describe(step)}: {size}{transactions} transaction(s), "
+                      f"~{seconds:.2f} s, longest write lock ~{lock:.3f} s")
+    finally:
+        conn.close()
+    print(f"Estimated total: ~{total:.1f} s")
+    return total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply FleetFlow schema migrations")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="print pending migrations and their estimated cost")
+    parser.add_argument("--target", type=int, default=None, help="stop after this version")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="rows per backfill transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between backfill chunks")
+    args = parser.parse_args(argv)
+
+    if args.dry_run:
+        dry_run(args.db, args.chunk_size, args.pause, args.target)
+        return
+    applied = run_migrations(args.db, args.chunk_size, args.pause, args.target, progress=print)
+    if applied:
+        print(f"Applied migration(s) {', '.join(str(v) for v in applied)}.")
+    else:
+        print("Schema is up to date.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+In-memory route network with cached all-pairs shortest paths.
+
+Hubs are the origin/destination names in `routes`; every active route is a
+directed leg origin -> destination weighted by distance_km. For each hub the
+network keeps a shortest-path tree (distance and predecessor leg to every
+reachable hub), so a path query is a dictionary lookup plus a walk back along
+the predecessors.
+
+create_app() builds the network once at startup (before gunicorn forks with
+--preload). Changes to `routes` are recorded in route_changes by triggers (see
+fleet_setup.py); when a request notices changes it has not seen, a background
+thread applies them to a copy of the network and swaps the copy in:
+
+- a new or shorter leg relaxes every pair through it in O(hubs^2);
+- a removed, deactivated or longer leg re-runs Dijkstra only for the hubs
+  whose shortest-path tree used that leg.
+
+Large batches of changes fall back to a full rebuild. Lookups always read the
+current published network and never wait for an update.
+"""
+
+import heapq
+import os
+import sqlite3
+import threading
+
+# More changes than this since the last sync triggers a full rebuild instead.
+FULL_REBUILD_THRESHOLD = 200
+
+class RouteNetwork:
+    """
+    Directed graph of active routes with a shortest-path tree per hub.
+
+    A published network is never modified. Updates go to a copy made by
+    updated(), which shares every per-hub dictionary it does not change.
+    """
+
+    def __init__(self):
+        self.legs = {}      # route_id -> (origin, destination, distance_km) for active routes
+        self.edges = {}     # (origin, destination) -> {route_id: distance_km}
+        self.adjacent = {}  # origin -> {destination: (distance_km, route_id)}, shortest leg only
+        self.dist = {}      # source -> {hub: distance_km}
+        self.pred = {}      # source -> {hub: (previous hub, route_id)}
+        self.last_change_id = 0
+
+    # ---------- building ----------
+    @classmethod
+    def build(cls, db):
+        """
+        Load every active route and compute shortest paths from every hub.
+        """
+        network = cls()
+        network.last_change_id = db.execute(
+            "SELECT COALESCE(MAX(change_id), 0) FROM route_changes"
+        ).fetchone()[0]
+        rows = db.execute(
+            """
+            SELECT route_id, origin, destination, distance_km, is_active
+            FROM routes
+            ORDER BY route_id
+            """
+        ).fetchall()
+        for route_id, origin, destination, distance_km, is_active in rows:
+            if is_active and distance_km is not None and distance_km >= 0:
+                network._add_leg(route_id, origin, destination, distance_km)
+        for hub in network.hubs():
+            network._dijkstra(hub)
+        return network
+
+    def hubs(self):
+        hubs = set(self.adjacent)
+        for neighbours in self.adjacent.values():
+            hubs.update(neighbours)
+        return hubs
+
+    def _add_leg(self, route_id, origin, destination, distance_km):
+        self.legs[route_id] = (origin, destination, distance_km)
+        legs = dict(self.edges.get((origin, destination), {}))
+        legs[route_id] = distance_km
+        self.edges[(origin, destination)] = legs
+        self._refresh_edge(origin, destination)
+
+    def _remove_leg(self, route_id):
+        origin, destination, _ = self.legs.pop(route_id)
+        legs = dict(self.edges[(origin, destination)])
+        del legs[route_id]
+        if legs:
+            self.edges[(origin, destination)] = legs
+        else:
+            del self.edges[(origin, destination)]
+        self._refresh_edge(origin, destination)
+
+    def _refresh_edge(self, origin, destination):
+        """
+        Point the adjacency entry at the shortest remaining leg between two hubs.
+        """
+        legs = self.edges.get((origin, destination))
+        neighbours = dict(self.adjacent.get(origin, {}))
+        if legs:
+            route_id = min(legs, key=lambda r: (legs[r], r))
+            neighbours[destination] = (legs[route_id], route_id)
+        else:
+            neighbours.pop(destination, None)
+        if neighbours:
+            self.adjacent[origin] = neighbours
+        else:
+            self.adjacent.pop(origin, None)
+
+    def _edge(self, origin, destination):
+        return self.adjacent.get(origin, {}).get(destination)
+
+    def _dijkstra(self, source):
+        dist = {source: 0.0}
+        pred = {}
+        heap = [(0.0, source)]
+        while heap:
+            d, hub = heapq.heappop(heap)
+            if d > dist[hub]:
+                continue
+            for neighbour, (weight, route_id) in self.adjacent.get(hub, {}).items():
+                candidate = d + weight
+                if candidate < dist.get(neighbour, float("inf")):
+                    dist[neighbour] = candidate
+                    pred[neighbour] = (hub, route_id)
+                    heapq.heappush(heap, (candidate, neighbour))
+        self.dist[source] = dist
+        self.pred[source] = pred
+
+    # ---------- incremental updates ----------
+    def updated(self, db):
+        """
+        A new network with the route changes recorded since this one was
+        built, or self if there are none.
+        """
+        changes = db.execute(
+            """
+            SELECT change_id, route_id
+            FROM route_changes
+            WHERE change_id > ?
+            ORDER BY change_id
+            """,
+            (self.last_change_id,),
+        ).fetchall()
+        if not changes:
+            return self
+        if len(changes) > FULL_REBUILD_THRESHOLD:
+            return RouteNetwork.build(db)
+
+        network = RouteNetwork()
+        network.legs = dict(self.legs)
+        network.edges = dict(self.edges)
+        network.adjacent = dict(self.adjacent)
+        network.dist = dict(self.dist)
+        network.pred = dict(self.pred)
+        for route_id in dict.fromkeys(change[1] for change in changes):
+            row = db.execute(
+                """
+                SELECT origin, destination, distance_km, is_active
+                FROM routes
+                WHERE route_id = ?
+                """,
+                (route_id,),
+            ).fetchone()
+            network._apply_route(route_id, row)
+        # A hub whose last leg went away is gone, as it would be after a rebuild.
+        hubs = network.hubs()
+        for source in [source for source in network.dist if source not in hubs]:
+            del network.dist[source]
+            del network.pred[source]
+        network.last_change_id = changes[-1][0]
+        return network
+
+    def _apply_route(self, route_id, row):
+        """
+        Bring one route's leg in line with its current row (None if deleted).
+        """
+        old = self.legs.get(route_id)
+        new = None
+        if row is not None and row[3] and row[2] is not None and row[2] >= 0:
+            new = (row[0], row[1], row[2])
+        if old == new:
+            return
+
+        touched = set()
+        if old is not None:
+            touched.add((old[0], old[1]))
+        if new is not None:
+            touched.add((new[0], new[1]))
+        before = {key: self._edge(*key) for key in touched}
+
+        if old is not None:
+            self._remove_leg(route_id)
+        if new is not None:
+            self._add_leg(route_id, *new)
+
+        for origin, destination in touched:
+            previous = before[(origin, destination)]
+            current = self._edge(origin, destination)
+            if previous == current:
+                continue
+            if previous is not None:
+                # The old leg may have been on some shortest paths; redo those trees.
+                self._recompute_trees_using(origin, destination, previous[1])
+            if current is not None and (previous is None or current[0] < previous[0]):
+                self._relax_through(origin, destination, current[0], current[1])
+
+    def _recompute_trees_using(self, origin, destination, route_id):
+        for source in list(self.pred):
+            if self.pred[source].get(destination) == (origin, route_id):
+                self._dijkstra(source)
+
+    def _relax_through(self, origin, destination, weight, route_id):
+        """
+        A leg origin -> destination got shorter (or appeared): improve every
+        pair (s, t) whose path can now go s ~> origin -> destination ~> t.
+        A source's dictionaries are copied before its first change, since the
+        originals may still be shared with the published network.
+        """
+        for hub in (origin, destination):
+            if hub not in self.dist:
+                self._dijkstra(hub)
+        from_destination = self.dist[destination]
+        pred_destination = self.pred[destination]
+        for source in list(self.dist):
+            dist = self.dist[source]
+            to_origin = dist.get(origin)
+            if to_origin is None:
+                continue
+            copied = False
+            for target, onward in from_destination.items():
+                candidate = to_origin + weight + onward
+                if candidate < dist.get(target, float("inf")):
+                    if not copied:
+                        dist = self.dist[source] = dict(dist)
+                        pred = self.pred[source] = dict(self.pred[source])
+                        copied = True
+                    dist[target] = candidate
+                    pred[target] = (origin, route_id) if target == destination else pred_destination[target]
+
+    # ---------- queries ----------
+    def shortest_path(self, origin, destination):
+        """
+        (distance_km, legs) for the shortest chain of active routes, where legs
+        is a list of (route_id, origin, destination, distance_km); or None if
+        destination cannot be reached from origin.
+        """
+        dist = self.dist.get(origin)
+        if dist is None or destination not in dist:
+            return None
+        pred = self.pred[origin]
+        legs = []
+        hub = destination
+        while hub != origin:
+            hub, route_id = pred[hub]
+            legs.append((route_id, *self.legs[route_id]))
+        legs.reverse()
+        return dist[destination], legs
+
+class RouteGraph:
+    """
+    The route network published to one worker process. Requests read
+    `network`; refresh_if_changed() brings it up to date in a background
+    thread and swaps the new network in when it is ready.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.network = None
+        self._pid = os.getpid()
+        self._refreshing = threading.Lock()
+
+    def load(self):
+        """
+        Build the network now (at startup). Returns the number of hubs.
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self.network = RouteNetwork.build(conn)
+        finally:
+            conn.close()
+        return len(self.network.dist)
+
+    def refresh(self):
+        """
+        Apply outstanding route changes and publish the result. Only one
+        refresh runs at a time per process; returns False if one already was.
+        """
+        if not self._refreshing.acquire(blocking=False):
+            return False
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                if self.network is None:
+                    self.network = RouteNetwork.build(conn)
+                else:
+                    self.network = self.network.updated(conn)
+            finally:
+                conn.close()
+        finally:
+            self._refreshing.release()
+        return True
+
+    def refresh_if_changed(self, db):
+        """
+        Start a background refresh if route_changes has entries the published
+        network has not seen. Costs one primary-key lookup when nothing changed.
+        """
+        if os.getpid() != self._pid:
+            # Forked worker: a refresh in progress in the parent is not ours.
+            self._pid = os.getpid()
+            self._refreshing = threading.Lock()
+        latest = db.execute("SELECT MAX(change_id) FROM route_changes").fetchone()[0] or 0
+        network = self.network
+        if network is not None and latest <= network.last_change_id:
+            return
+        if self._refreshing.locked():
+            return
+        threading.Thread(target=self.refresh, name="route-graph-refresh", daemon=True).start()
@@ -0,0 +1,21 @@
+"""
+Rowid chunking shared by the maintenance scripts that walk a table in short
+transactions (integrity_scan.py, migrate.py).
+"""
+
+def next_chunk_end(conn, table, last_rowid, chunk_size):
+    """
+    Highest rowid of the next chunk after last_rowid, or None at the end.
+    """
+    row = conn.execute(
+        f"""
+        SELECT MAX(rowid) FROM (
+            SELECT rowid FROM {table}
+            WHERE rowid > ?
+            ORDER BY rowid
+            LIMIT ?
+        )
+        """,
+        (last_rowid, chunk_size),
+    ).fetchone()
+    return row[0]
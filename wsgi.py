@@ -0,0 +1,17 @@
+"""
+Production entry point for FleetFlow.
+
+Run one worker per CPU core with gunicorn (pip install gunicorn):
+
+    FLEETFLOW_DATABASE=/srv/fleetflow/fleetflow.db \
+        gunicorn --preload --workers "$(nproc)" --bind 0.0.0.0:8000 wsgi:app
+
+--preload builds the app once in the master process, so template compilation
+and database warm-up happen a single time and are shared by every forked
+worker. Each worker then opens its own pooled SQLite connections on first use.
+Point load balancer health checks at /healthz (liveness) and /readyz (readiness).
+"""
+
+from app import create_app
+
+app = create_app()